@@ -1,6 +1,10 @@
 import streamlit as st
 from utils.styles import load_css
 from utils.rag_engine import RAGEngine
+from utils.filters import scope_filter_ui
+from utils.context_packer import estimate_tokens, get_token_budget
+from utils.query_expansion import MULTI_QUERY_MODES, get_multi_query_mode
+from utils.history_store import ChatHistoryStore
 import time
 import os
 
@@ -9,13 +13,39 @@ load_css()
 
 st.title("💬 Chat with Documents")
 
+# Messages rendered per rerun; older ones are shown on demand
+HISTORY_WINDOW = 20
+# Messages loaded when resuming a conversation (the rest stay in the History page)
+MAX_LOADED_MESSAGES = 200
+# Recent messages replayed into the model's memory when the chain is rebuilt
+MEMORY_MESSAGES = 10
+
 # Initialize Session State
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+if "history_window" not in st.session_state:
+    st.session_state.history_window = HISTORY_WINDOW
+
 if "rag_engine" not in st.session_state:
     st.session_state.rag_engine = RAGEngine()
 
+if "history_store" not in st.session_state:
+    st.session_state.history_store = ChatHistoryStore()
+
+# Resume a conversation opened from the History page or kept in the URL
+resume_id = st.session_state.pop("resume_conversation", None) or st.query_params.get("conversation")
+if resume_id and resume_id != st.session_state.get("conversation_id"):
+    if st.session_state.history_store.get_conversation(resume_id):
+        st.session_state.conversation_id = resume_id
+        st.session_state.messages = [
+            {"role": m["role"], "content": m["content"]}
+            for m in st.session_state.history_store.get_messages(resume_id, limit=MAX_LOADED_MESSAGES)
+        ]
+        st.session_state.history_window = HISTORY_WINDOW
+        st.session_state.pop("chain", None)
+        st.query_params["conversation"] = resume_id
+
 # Sidebar Settings
 with st.sidebar:
     st.header("Model Settings")
@@ -28,39 +58,84 @@ with st.sidebar:
         model_name = st.text_input("Ollama Model", value=default_model)
     
     temperature = st.slider("Temperature", 0.0, 1.0, 0.7)
+    token_budget = st.slider(
+        "Context budget (tokens)", 250, 8000, get_token_budget(model_provider), step=250,
+        help="Retrieved chunks are merged (overlaps removed) and packed by relevance up to this many tokens."
+    )
+    multi_query = st.selectbox(
+        "Multi-query retrieval", MULTI_QUERY_MODES, index=MULTI_QUERY_MODES.index(get_multi_query_mode()),
+        help="Also search rewrites of the question (rule-based, or written by the model in one extra call). "
+             "Variants are searched in parallel and their results fused."
+    )
     
     st.divider()
+
+    st.header("🎯 Search Scope")
+    with st.expander("Filter documents", expanded=False):
+        where = scope_filter_ui(st.session_state.rag_engine.db_manager, key="chat_scope")
+    if where:
+        st.caption("Answers are limited to the selected scope.")
+
+    st.divider()
     
     # Reset Chat Button
     st.markdown("### 🗑️ Reset Chat")
-    if st.button("🔄 Clear History", type="secondary", use_container_width=True):
+    if st.button("🔄 New Conversation", type="secondary", use_container_width=True, help="The current conversation stays in the History page."):
         st.session_state.messages = []
+        st.session_state.conversation_id = None
+        st.session_state.history_window = HISTORY_WINDOW
+        st.query_params.pop("conversation", None)
         if "chain" in st.session_state:
             del st.session_state.chain  # Also clear chain to reset memory
         st.success("✅ Chat cleared!")
         st.rerun()
 
 # Initialize or update chain when settings change
-chain_key = f"{model_provider}_{model_name}_{temperature}"
+# The active collection changes when it is re-embedded or rebuilt
+active_collection = st.session_state.rag_engine.db_manager.get_active_collection_name()
+retrieval_backend = st.session_state.rag_engine.db_manager.get_retrieval_backend()
+chain_key = f"{model_provider}_{model_name}_{temperature}_{active_collection}_{retrieval_backend}_{where}_{token_budget}_{multi_query}"
 if "chain_key" not in st.session_state or st.session_state.chain_key != chain_key or "chain" not in st.session_state:
     # Settings changed or chain not initialized, recreate chain
     with st.spinner("Initializing model..."):
         st.session_state.chain = st.session_state.rag_engine.get_chain(
             model_provider=model_provider,
             model_name=model_name,
-            temperature=temperature
+            temperature=temperature,
+            where=where,
+            token_budget=token_budget,
+            multi_query=multi_query
         )
+        # Keep the recent turns (e.g. of a resumed conversation) in the new chain's memory
+        chat_memory = st.session_state.chain.memory.chat_memory
+        for message in st.session_state.messages[-MEMORY_MESSAGES:]:
+            if message["role"] == "user":
+                chat_memory.add_user_message(message["content"])
+            else:
+                chat_memory.add_ai_message(message["content"])
         st.session_state.chain_key = chain_key
 
-# Display Chat History
-for message in st.session_state.messages:
+# Display Chat History (only the most recent messages, so long conversations stay fast)
+hidden_messages = len(st.session_state.messages) - st.session_state.history_window
+if hidden_messages > 0:
+    if st.button(f"⬆️ Show {min(hidden_messages, HISTORY_WINDOW)} earlier messages"):
+        st.session_state.history_window += HISTORY_WINDOW
+        st.rerun()
+for message in st.session_state.messages[-st.session_state.history_window:]:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
 # Chat Input
 if prompt := st.chat_input("Ask something about your documents..."):
     # Add user message
+    history_store = st.session_state.history_store
+    conversation_id = st.session_state.get("conversation_id")
+    # Start a new conversation if there is none yet or it was deleted in the History page
+    if not conversation_id or history_store.get_conversation(conversation_id) is None:
+        st.session_state.conversation_id = history_store.create_conversation()
+        st.query_params["conversation"] = st.session_state.conversation_id
     st.session_state.messages.append({"role": "user", "content": prompt})
+    history_store.append_message(st.session_state.conversation_id, "user", prompt)
     with st.chat_message("user"):
         st.markdown(prompt)
 
@@ -72,6 +147,10 @@ if prompt := st.chat_input("Ask something about your documents..."):
         try:
             with st.spinner("Thinking..."):
                 # Use persisted chain
+                # History the chain sends along with the question (read before it records this turn)
+                history_tokens = sum(
+                    estimate_tokens(m.content) for m in st.session_state.chain.memory.chat_memory.messages
+                )
                 result = st.session_state.chain.invoke({"question": prompt, "chat_history": []})
                 response_text = result["answer"]
                 
@@ -83,16 +162,41 @@ if prompt := st.chat_input("Ask something about your documents..."):
                     if i % 3 == 0 or i == len(words) - 1:
                         message_placeholder.markdown(full_response + "▌")
                         time.sleep(0.02)  # Minimal delay for visual effect
-                message_placeholder.markdown(full_response)
+                message_placeholder.markdown(response_text)
+
+                context_report = st.session_state.chain.retriever.last_report
+                if context_report:
+                    st.caption(
+                        f"🧮 Prompt: ≈{context_report['context_tokens'] + estimate_tokens(prompt) + history_tokens} tokens "
+                        f"(context ≈{context_report['context_tokens']} in {context_report['packed_passages']} passages from "
+                        f"{context_report['retrieved_chunks']} chunks, ≈{context_report['retrieved_tokens']} before merging, "
+                        f"budget {context_report['token_budget']}; question and history ≈{estimate_tokens(prompt) + history_tokens})"
+                    )
+                fanout_report = getattr(st.session_state.chain.retriever.base_retriever, "last_report", None)
+                if fanout_report:
+                    st.caption(
+                        f"🔀 {len(fanout_report['queries'])} query variants searched in parallel in "
+                        f"{fanout_report['search_seconds'] * 1000:.0f} ms (slowest single search "
+                        f"{fanout_report['slowest_search_seconds'] * 1000:.0f} ms), {fanout_report['candidates']} unique chunks fused",
+                        help="\n".join(f"- {query}" for query in fanout_report["queries"])
+                    )
                 
                 # Show sources
                 if result.get("source_documents"):
                     with st.expander("📚 Sources"):
+                        duplicate_sources = st.session_state.rag_engine.db_manager.get_duplicate_sources(
+                            [doc.metadata["chunk_id"] for doc in result["source_documents"] if "chunk_id" in doc.metadata]
+                        )
                         for i, doc in enumerate(result["source_documents"], 1):
                             st.markdown(f"**Source {i}: {doc.metadata.get('source', 'Unknown')}**")
                             st.markdown(f"```\n{doc.page_content[:300]}...\n```")
+                            also_in = duplicate_sources.get(doc.metadata.get("chunk_id"), [])
+                            if also_in:
+                                st.caption("Also in: " + ", ".join(f"{d['source']} (p. {(d['page'] or 0) + 1})" for d in also_in))
 
-            st.session_state.messages.append({"role": "assistant", "content": full_response})
+            # Store the answer as written; full_response lost its line breaks to the typing effect
+            st.session_state.messages.append({"role": "assistant", "content": response_text})
+            history_store.append_message(st.session_state.conversation_id, "assistant", response_text)
             
         except Exception as e:
             st.error(f"❌ Error: {str(e)}")
@@ -1,6 +1,7 @@
 import streamlit as st
 from utils.styles import load_css
 from utils.rag_engine import RAGEngine
+from utils.filters import scope_filter_ui
 import pandas as pd
 
 st.set_page_config(page_title="Documents", page_icon="📂", layout="wide")
@@ -29,12 +30,19 @@ with col1:
             status_text = st.empty()
             
             total_chunks = 0
+            total_duplicates = 0
+            seconds_saved = 0.0
             for i, file in enumerate(uploaded_files):
                 status_text.text(f"⚙️ Processing {file.name}...")
                 try:
                     num_chunks = st.session_state.rag_engine.ingest_file(file)
                     total_chunks += num_chunks
                     st.toast(f"✅ {file.name} processed ({num_chunks} chunks)", icon="✅")
+                    report = st.session_state.rag_engine.last_ingest_report
+                    if report and report["duplicates"]:
+                        total_duplicates += report["duplicates"]
+                        seconds_saved += report["embed_seconds_saved"]
+                        st.toast(f"♻️ {file.name}: {report['duplicates']} near-duplicate chunks not re-embedded ({report['reused']} stored with a reused vector)", icon="♻️")
                 except Exception as e:
                     st.error(f"❌ Error processing {file.name}: {str(e)}")
                 
@@ -42,6 +50,8 @@ with col1:
             
             status_text.text("✨ All files processed!")
             st.success(f"🎉 Successfully added **{total_chunks}** new chunks to the database.")
+            if total_duplicates:
+                st.info(f"♻️ Did not re-embed **{total_duplicates}** near-duplicate chunks (~{seconds_saved:.1f}s of embedding saved).")
             st.balloons()
 
 with col2:
@@ -53,6 +63,11 @@ with col2:
     stats = st.session_state.rag_engine.db_manager.get_collection_stats()
     
     st.metric("Total Chunks", stats.get('count', 0), delta=None)
+
+    dedup_stats = st.session_state.rag_engine.db_manager.get_dedup_stats()
+    if dedup_stats.get("duplicates"):
+        st.metric("♻️ Near-Duplicates Not Re-embedded", int(dedup_stats["duplicates"]))
+        st.caption(f"Saved ~{dedup_stats.get('embed_seconds_saved', 0):.1f}s of embedding and {dedup_stats.get('bytes_saved', 0) / 1e6:.2f} MB of storage.")
     
     # Show storage info
     st.markdown("**💾 Storage Location:**")
@@ -158,14 +173,16 @@ if st.session_state.get("show_search", False):
     st.markdown("### 🔍 Search Test")
     
     query = st.text_input("Enter search query:", placeholder="What are you looking for?")
+    with st.expander("🎯 Filter documents"):
+        where = scope_filter_ui(st.session_state.rag_engine.db_manager, key="documents_scope")
     
     if query:
         with st.spinner("Searching..."):
-            results = st.session_state.rag_engine.vector_store.similarity_search(query, k=5)
+            results = st.session_state.rag_engine.vector_store.similarity_search(query, k=5, filter=where)
             
             st.markdown(f"**Found {len(results)} results:**")
             
             for i, doc in enumerate(results, 1):
                 with st.expander(f"📄 Result {i}: {doc.metadata.get('source', 'Unknown')}"):
                     st.markdown(doc.page_content)
-                    st.caption(f"Source: {doc.metadata.get('source', 'Unknown')}")
+                    st.caption(f"Source: {doc.metadata.get('source', 'Unknown')} · Page {doc.metadata.get('page', 0) + 1}")
@@ -1,6 +1,7 @@
 import streamlit as st
 from utils.styles import load_css
 from utils.rag_engine import RAGEngine
+from utils.filters import scope_filter_ui
 import pandas as pd
 
 st.set_page_config(page_title="Database Inspector", page_icon="🔍", layout="wide")
@@ -39,8 +40,41 @@ else:
 
 st.markdown("### Search Test")
 query = st.text_input("Test Query", "What is...")
+with st.expander("🎯 Filter documents"):
+    where = scope_filter_ui(st.session_state.rag_engine.db_manager, key="database_scope")
 if query:
-    results = st.session_state.rag_engine.vector_store.similarity_search(query, k=3)
+    results = st.session_state.rag_engine.vector_store.similarity_search(query, k=3, filter=where)
     for i, doc in enumerate(results):
         with st.expander(f"Result {i+1} (Source: {doc.metadata.get('source', 'Unknown')})"):
             st.markdown(doc.page_content)
+
+st.markdown("### 📦 Snapshots")
+st.markdown("Export the collection (chunks, metadata and embeddings) to a checksummed snapshot, or import one without re-embedding. Importing replaces the current contents.")
+
+db_manager = st.session_state.rag_engine.db_manager
+col1, col2 = st.columns(2)
+
+with col1:
+    export_path = st.text_input("Export to directory", "./data/snapshots/documents")
+    if st.button("📤 Export Snapshot", use_container_width=True):
+        with st.spinner("Exporting snapshot..."):
+            try:
+                manifest = db_manager.export_snapshot(export_path)
+                st.success(f"Exported {manifest['count']} chunks ({manifest['embedding_model']}) in {len(manifest['shards'])} shards.")
+            except Exception as e:
+                st.error(f"❌ Error: {str(e)}")
+
+with col2:
+    import_path = st.text_input("Import from directory", "./data/snapshots/documents")
+    # Shared across sessions: rebuilds, re-embeds and imports run one at a time
+    build = db_manager.get_running_build()
+    if build is not None:
+        st.caption(f"Import is disabled while a {build['kind']} of the collection is running.")
+    if st.button("📥 Import Snapshot", use_container_width=True, disabled=build is not None):
+        with st.spinner("Importing snapshot..."):
+            try:
+                manifest = db_manager.import_snapshot(import_path)
+                st.session_state.pop("chain", None)
+                st.success(f"Imported {manifest['count']} chunks ({manifest['embedding_model']}).")
+            except Exception as e:
+                st.error(f"❌ Error: {str(e)}")
@@ -1,29 +1,166 @@
 import streamlit as st
 from utils.styles import load_css
-import json
+from utils.history_store import ChatHistoryStore, EXPORT_FORMATS
+from datetime import datetime
+import os
+import tempfile
+import time
 
 st.set_page_config(page_title="History", page_icon="📜", layout="wide")
 load_css()
 
 st.title("📜 Chat History")
 
-if "messages" not in st.session_state or not st.session_state.messages:
+PAGE_SIZE = 20
+# Messages shown per conversation before "Show all"
+VIEW_WINDOW = 50
+# Prepared exports wait here until downloaded; ones left by closed sessions are swept after a day
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "chat_history_exports")
+EXPORT_MAX_AGE = 24 * 3600
+
+if "history_store" not in st.session_state:
+    st.session_state.history_store = ChatHistoryStore()
+if "history_page" not in st.session_state:
+    st.session_state.history_page = 0
+
+store = st.session_state.history_store
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+
+
+def discard_export():
+    export = st.session_state.pop("history_export", None)
+    if export and os.path.exists(export["path"]):
+        os.remove(export["path"])
+
+
+def sweep_exports():
+    cutoff = time.time() - EXPORT_MAX_AGE
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def continue_in_chat(conversation_id):
+    st.session_state.resume_conversation = conversation_id
+    st.switch_page("pages/1_💬_Chat.py")
+
+
+total = store.count_conversations()
+if not total:
     st.info("No chat history available yet.")
-else:
-    st.markdown("### Current Session")
-    for msg in st.session_state.messages:
+    st.stop()
+
+# Search
+query = st.text_input("🔍 Search past conversations", placeholder="Words to find in any question or answer")
+if query:
+    results = store.search(query, limit=PAGE_SIZE)
+    st.caption(f"Showing the {len(results)} best matches." if len(results) == PAGE_SIZE else f"{len(results)} matches.")
+    for result in results:
+        role = "👤" if result["role"] == "user" else "🤖"
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            st.markdown(f"**{result['title'] or 'Untitled'}** · {format_time(result['created_at'])}")
+            st.markdown(f"{role} {result['snippet']}")
+        with col2:
+            if st.button("View", key=f"view_result_{result['id']}", use_container_width=True):
+                st.session_state.history_selected = result["conversation_id"]
+    st.divider()
+
+# Conversations, one page at a time
+st.markdown(f"### Conversations ({total})")
+pages = max(1, -(-total // PAGE_SIZE))
+st.session_state.history_page = min(st.session_state.history_page, pages - 1)
+
+col1, col2, col3 = st.columns([1, 2, 1])
+with col1:
+    if st.button("⬅️ Newer", disabled=st.session_state.history_page == 0, use_container_width=True):
+        st.session_state.history_page -= 1
+        st.rerun()
+with col2:
+    st.caption(f"Page {st.session_state.history_page + 1} of {pages}")
+with col3:
+    if st.button("Older ➡️", disabled=st.session_state.history_page >= pages - 1, use_container_width=True):
+        st.session_state.history_page += 1
+        st.rerun()
+
+for conversation in store.list_conversations(PAGE_SIZE, st.session_state.history_page * PAGE_SIZE):
+    col1, col2 = st.columns([5, 1])
+    with col1:
+        st.markdown(f"**{conversation['title'] or 'Untitled'}**")
+        st.caption(f"{format_time(conversation['updated_at'])} · {conversation['message_count']} messages")
+    with col2:
+        if st.button("View", key=f"view_{conversation['id']}", use_container_width=True):
+            st.session_state.history_selected = conversation["id"]
+
+# Selected conversation
+selected = st.session_state.get("history_selected")
+conversation = store.get_conversation(selected) if selected else None
+if conversation:
+    st.divider()
+    st.markdown(f"### {conversation['title'] or 'Untitled'}")
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("💬 Continue in Chat", use_container_width=True):
+            continue_in_chat(conversation["id"])
+    with col2:
+        if st.button("🗑️ Delete Conversation", use_container_width=True):
+            store.delete_conversation(conversation["id"])
+            st.session_state.pop("history_selected", None)
+            # The Chat page must not keep appending to the deleted conversation
+            if st.session_state.get("conversation_id") == conversation["id"]:
+                st.session_state.conversation_id = None
+                st.session_state.messages = []
+                st.session_state.pop("chain", None)
+                st.query_params.pop("conversation", None)
+            st.rerun()
+
+    show_all = conversation["message_count"] <= VIEW_WINDOW or st.checkbox(
+        f"Show all {conversation['message_count']} messages", key=f"show_all_{conversation['id']}"
+    )
+    if not show_all:
+        st.caption(f"Showing the last {VIEW_WINDOW} messages.")
+    for msg in store.get_messages(conversation["id"], limit=None if show_all else VIEW_WINDOW):
         role = "👤 User" if msg["role"] == "user" else "🤖 Assistant"
         with st.chat_message(msg["role"]):
             st.write(f"**{role}**: {msg['content']}")
-            
-    st.divider()
-    
-    # Export options
-    st.markdown("### Export")
-    history_json = json.dumps(st.session_state.messages, indent=2)
-    st.download_button(
-        label="Download History (JSON)",
-        data=history_json,
-        file_name="chat_history.json",
-        mime="application/json"
-    )
+
+st.divider()
+
+# Export options
+st.markdown("### Export")
+st.caption("The download is served from memory, so for very large histories export from the command line instead: `python -m utils.history_store export history.jsonl`.")
+
+col1, col2 = st.columns(2)
+with col1:
+    export_format = st.selectbox("Format", EXPORT_FORMATS, help="jsonl: one message per line. json: a list of conversations.")
+with col2:
+    scopes = ["All conversations"] + (["Selected conversation"] if conversation else [])
+    export_scope = st.selectbox("Conversations", scopes)
+
+if st.button("Prepare Export"):
+    discard_export()
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    sweep_exports()
+    conversation_ids = [conversation["id"]] if export_scope == "Selected conversation" else None
+    with tempfile.NamedTemporaryFile(dir=EXPORT_DIR, suffix=f".{export_format}", delete=False) as f:
+        store.export(f, export_format, conversation_ids)
+    st.session_state.history_export = {"path": f.name, "format": export_format}
+
+export = st.session_state.get("history_export")
+if export and os.path.exists(export["path"]):
+    with open(export["path"], "rb") as f:
+        st.download_button(
+            label=f"Download History ({export['format'].upper()})",
+            data=f,
+            file_name=f"chat_history.{export['format']}",
+            mime="application/x-ndjson" if export["format"] == "jsonl" else "application/json",
+            # Streamlit already holds the data for this download, so the file can go
+            on_click=discard_export
+        )
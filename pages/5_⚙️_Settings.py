@@ -1,5 +1,7 @@
 import streamlit as st
 from utils.styles import load_css
+from utils.db_manager import DBManager, DEDUP_MODES, HNSW_SPACES, QUANTIZATIONS, RETRIEVAL_BACKENDS
+from utils.query_expansion import MULTI_QUERY_MODES, get_multi_query_mode
 import os
 
 st.set_page_config(page_title="Settings", page_icon="⚙️", layout="wide")
@@ -7,6 +9,29 @@ load_css()
 
 st.title("⚙️ Settings")
 
+
+def update_env_file(updates):
+    """Sets the given keys in os.environ and .env, keeping every other entry."""
+    env_content = {}
+    if os.path.exists(".env"):
+        try:
+            with open(".env", "r", encoding="utf-8") as f:
+                for line in f:
+                    if "=" in line:
+                        k, v = line.strip().split("=", 1)
+                        env_content[k] = v
+        except UnicodeDecodeError:
+            pass
+
+    for k, v in updates.items():
+        os.environ[k] = v
+        env_content[k] = v
+
+    with open(".env", "w", encoding="utf-8") as f:
+        for k, v in env_content.items():
+            f.write(f"{k}={v}\n")
+
+
 st.markdown("### 🔑 API Keys")
 
 api_key = st.text_input(
@@ -17,10 +42,7 @@ api_key = st.text_input(
 )
 
 if api_key:
-    os.environ["GOOGLE_API_KEY"] = api_key
-    # Save to .env
-    with open(".env", "w") as f:
-        f.write(f"GOOGLE_API_KEY={api_key}\n")
+    update_env_file({"GOOGLE_API_KEY": api_key})
     st.success("API Key saved to .env!")
 else:
     st.warning("No Google API Key found. Gemini features will not work.")
@@ -31,35 +53,133 @@ ollama_model = st.text_input("Ollama Chat Model", value=os.getenv("OLLAMA_MODEL"
 ollama_embedding = st.text_input("Embedding Model (Sentence Transformers)", value=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"), help="HuggingFace model name (e.g., all-MiniLM-L6-v2, intfloat/multilingual-e5-large)")
 
 if st.button("Save Configuration"):
-    os.environ["OLLAMA_HOST"] = ollama_url
-    os.environ["OLLAMA_MODEL"] = ollama_model
-    os.environ["EMBEDDING_MODEL"] = ollama_embedding
-    
-    # Update .env safely
-    env_content = {}
-    if os.path.exists(".env"):
+    update_env_file({
+        "OLLAMA_HOST": ollama_url,
+        "OLLAMA_MODEL": ollama_model,
+        "EMBEDDING_MODEL": ollama_embedding,
+    })
+    st.success("Ollama configuration saved to .env!")
+
+st.markdown("### 🧬 Embedding Model")
+
+db_manager = DBManager()
+collection_model = db_manager.get_collection_embedding_model()
+configured_model = db_manager.get_embedding_model_id()
+job = db_manager.get_reembedding_status()
+reembedding = job is not None and job["state"] == "running"
+# Rebuilds, re-embeds and imports of a collection run one at a time (across sessions)
+build = db_manager.get_running_build()
+
+st.markdown(f"**Collection embedded with:** `{collection_model}`")
+
+if reembedding:
+    st.info(f"🔄 Re-embedding with `{job['embedding_model']}`: {job['done']}/{job['total']} chunks. Queries keep using the current version until it finishes.")
+    st.progress(min(job["done"] / max(job["total"], 1), 1.0))
+    if st.button("🔄 Refresh Status"):
+        st.rerun()
+else:
+    if job and job["state"] == "failed":
+        st.error(f"❌ Re-embedding failed: {job['error']}")
+    elif job and job["state"] == "done":
+        st.success(f"✅ Collection re-embedded with `{job['embedding_model']}`.")
+
+    if collection_model != configured_model:
+        st.warning(f"The configured model `{configured_model}` differs from the collection's. Documents are still searched with `{collection_model}` until the collection is re-embedded.")
+        if st.button("🧬 Re-embed Collection", disabled=build is not None):
+            db_manager.start_reembedding(embedding_model=configured_model)
+            st.rerun()
+
+st.markdown("### 🧭 Vector Index (HNSW)")
+st.caption("Tune the accuracy/latency trade-off of the `documents` collection. Run `python -m utils.hnsw_sweep` to measure recall@k and p95 latency on your own corpus before changing these.")
+
+hnsw_params = db_manager.get_hnsw_params()
+
+col1, col2 = st.columns(2)
+with col1:
+    hnsw_space = st.selectbox("Distance", HNSW_SPACES, index=HNSW_SPACES.index(hnsw_params["space"]), help="l2 (Euclidean), cosine or ip (inner product)")
+    hnsw_m = st.number_input("M (graph links per node)", min_value=2, max_value=128, value=hnsw_params["M"], help="Higher = better recall, more memory")
+with col2:
+    hnsw_construction_ef = st.number_input("construction_ef", min_value=1, max_value=2000, value=hnsw_params["construction_ef"], help="Higher = better graph quality, slower ingestion")
+    hnsw_search_ef = st.number_input("search_ef", min_value=1, max_value=2000, value=hnsw_params["search_ef"], help="Higher = better recall, slower queries")
+
+if build is not None:
+    st.caption(f"Rebuilding is disabled while a {build['kind']} of the collection is running.")
+if st.button("Apply & Rebuild Index", disabled=build is not None):
+    with st.spinner("Rebuilding vector index..."):
         try:
-            with open(".env", "r", encoding="utf-8") as f:
-                for line in f:
-                    if "=" in line:
-                        k, v = line.strip().split("=", 1)
-                        env_content[k] = v
-        except UnicodeDecodeError:
-            pass
-            
-    env_content["OLLAMA_HOST"] = ollama_url
-    env_content["OLLAMA_MODEL"] = ollama_model
-    env_content["EMBEDDING_MODEL"] = ollama_embedding
-    
-    # Ensure GOOGLE_API_KEY is preserved if not in env_content but in os.environ
-    if "GOOGLE_API_KEY" not in env_content and os.getenv("GOOGLE_API_KEY"):
-        env_content["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
+            rebuilt = db_manager.set_hnsw_params(
+                space=hnsw_space,
+                M=hnsw_m,
+                construction_ef=hnsw_construction_ef,
+                search_ef=hnsw_search_ef
+            )
+            # Cached engines still point at the old collection
+            st.session_state.pop("rag_engine", None)
+            st.session_state.pop("chain", None)
+            if rebuilt:
+                st.success("Index rebuilt with the new HNSW parameters!")
+            else:
+                st.success("HNSW parameters saved.")
+        except Exception as e:
+            st.error(f"❌ Error: {str(e)}")
 
-    with open(".env", "w", encoding="utf-8") as f:
-        for k, v in env_content.items():
-            f.write(f"{k}={v}\n")
-            
-    st.success("Ollama configuration saved to .env!")
+st.markdown("### 🗜️ Retrieval Backend")
+st.caption("`compact` searches int8 or binary quantised vectors in a memory-mapped index and re-scores the best candidates exactly, using far less memory than the HNSW index on large collections.")
+
+col1, col2 = st.columns(2)
+with col1:
+    backend = db_manager.get_retrieval_backend()
+    retrieval_backend = st.selectbox("Backend", RETRIEVAL_BACKENDS, index=RETRIEVAL_BACKENDS.index(backend) if backend in RETRIEVAL_BACKENDS else 0)
+with col2:
+    quantization = os.getenv("COMPACT_QUANTIZATION", "int8")
+    compact_quantization = st.selectbox("Quantization", QUANTIZATIONS, index=QUANTIZATIONS.index(quantization) if quantization in QUANTIZATIONS else 0, help="int8: ~4x smaller, near-lossless. binary: ~32x smaller, needs more re-scoring.")
+multi_query = st.selectbox(
+    "Multi-query retrieval (default)", MULTI_QUERY_MODES, index=MULTI_QUERY_MODES.index(get_multi_query_mode()),
+    help="rules: search the question plus keyword and statement rewrites. llm: let the model write the rewrites (one extra call). Variants are searched in parallel."
+)
+
+col1, col2 = st.columns(2)
+with col1:
+    if st.button("Save Backend", use_container_width=True):
+        update_env_file({
+            "RETRIEVAL_BACKEND": retrieval_backend,
+            "COMPACT_QUANTIZATION": compact_quantization,
+            "MULTI_QUERY": multi_query,
+        })
+        st.session_state.pop("chain", None)
+        st.success("Retrieval backend saved to .env!")
+with col2:
+    if st.button("Build & Evaluate Compact Index", use_container_width=True):
+        with st.spinner("Building compact index..."):
+            try:
+                report = db_manager.get_compact_index_report(quantization=compact_quantization, rebuild=True)
+                st.session_state.compact_report = report
+            except Exception as e:
+                st.error(f"❌ Error: {str(e)}")
+
+if "compact_report" in st.session_state:
+    report = st.session_state.compact_report
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Vectors", f"{report['count']:,} × {report['dim']}")
+    col2.metric("Memory", f"{report['compact_mb']:.1f} MB", delta=f"-{report['float32_mb'] - report['compact_mb']:.1f} MB vs float32", delta_color="inverse")
+    col3.metric("Recall@5", f"{report['recall@5']:.1%}", delta=f"-{report['recall_loss']:.1%}")
+
+st.markdown("### ♻️ Near-Duplicate Detection")
+st.caption("Chunks whose estimated similarity (MinHash) to an already indexed chunk reaches the threshold are not embedded again. `link` also records which document the duplicate came from.")
+
+col1, col2 = st.columns(2)
+with col1:
+    mode = os.getenv("DEDUP_MODE", "skip")
+    dedup_mode = st.selectbox("Mode", DEDUP_MODES, index=DEDUP_MODES.index(mode) if mode in DEDUP_MODES else 1)
+with col2:
+    dedup_threshold = st.slider("Similarity threshold", 0.5, 1.0, float(os.getenv("DEDUP_THRESHOLD", "0.85")), 0.01)
+
+if st.button("Save Deduplication"):
+    update_env_file({
+        "DEDUP_MODE": dedup_mode,
+        "DEDUP_THRESHOLD": str(dedup_threshold),
+    })
+    st.success("Deduplication settings saved to .env!")
 
 st.markdown("### 🎨 Appearance")
 theme = st.selectbox("Theme", ["Dark (Default)", "Light"])
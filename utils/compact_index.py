@@ -0,0 +1,363 @@
+"""Compact, memory-mapped vector index used as an alternative retrieval backend.
+
+Embeddings are L2-normalised and stored twice on disk:
+- a quantised copy (int8 with a per-row scale, or 1 bit per dimension) that
+  is scanned in full for a first-pass ranking, and
+- the float32 vectors, of which only the top candidates are read back for
+  exact cosine re-scoring.
+
+Both live in memory-mapped .npy files, so resident memory is dominated by
+the quantised codes instead of float32 vectors plus an HNSW graph.
+"""
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from utils.db_manager import QUANTIZATIONS
+
+# Candidates re-scored per requested result; 1-bit codes need a wider shortlist
+DEFAULT_RESCORE_FACTOR = {"int8": 4, "binary": 10}
+
+# Bumped when the on-disk layout changes; older indexes are rebuilt once
+FORMAT_VERSION = 2
+# Rows allocated up front; capacity doubles whenever appends run out of room
+MIN_CAPACITY = 1024
+
+# Number of set bits for every byte value, used for Hamming distances
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def quantize_int8(vectors):
+    """Symmetric per-row int8 quantisation. Returns (codes, scales)."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales = np.maximum(scales, 1e-12).astype(np.float32)
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales
+
+
+def quantize_binary(vectors):
+    """Sign quantisation, 8 dimensions packed per byte."""
+    return np.packbits(vectors > 0, axis=1)
+
+
+class CompactIndex:
+    def __init__(self, directory, quantization="int8"):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Invalid quantization '{quantization}'. Use one of {QUANTIZATIONS}.")
+        self.directory = directory
+        self.quantization = quantization
+        self.meta = None
+        self.ids = None
+        self.vectors = None
+        self.codes = None
+        self.scales = None
+        self._rows = None
+
+    # --- Building ---
+
+    def _open_arrays(self, directory, mode, capacity=None, dim=None):
+        """Memory-maps the row arrays; mode "w+" creates them with room for capacity rows."""
+        if self.quantization == "int8":
+            layout = {"vectors": (np.float32, (capacity, dim)), "codes": (np.int8, (capacity, dim)),
+                      "scales": (np.float32, (capacity,))}
+        else:
+            layout = {"vectors": (np.float32, (capacity, dim)), "codes": (np.uint8, (capacity, ((dim or 0) + 7) // 8))}
+
+        arrays = {}
+        for name, (dtype, shape) in layout.items():
+            path = os.path.join(directory, f"{name}.npy")
+            if mode == "w+":
+                arrays[name] = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+            else:
+                arrays[name] = np.load(path, mmap_mode=mode)
+        return arrays
+
+    def _write_rows(self, arrays, offset, embeddings):
+        end = offset + len(embeddings)
+        arrays["vectors"][offset:end] = embeddings
+        if self.quantization == "int8":
+            arrays["codes"][offset:end], arrays["scales"][offset:end] = quantize_int8(embeddings)
+        else:
+            arrays["codes"][offset:end] = quantize_binary(embeddings)
+        return end
+
+    @staticmethod
+    def _write_meta(directory, meta):
+        tmp_path = os.path.join(directory, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, os.path.join(directory, "meta.json"))
+
+    def build(self, collection, batch_size=1000):
+        """Streams a Chroma collection's embeddings into a new index on disk.
+
+        The index is written to a temporary directory and swapped in once
+        complete, so a failed build never corrupts the existing one. Files
+        get spare capacity so later ingests can be appended (see update()).
+        """
+        count = collection.count()
+        tmp_dir = f"{self.directory}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        ids = []
+        dim = 0
+        capacity = max(2 * count, MIN_CAPACITY)
+        arrays = None
+        offset = 0
+        while offset < count:
+            batch = collection.get(include=["embeddings"], limit=min(batch_size, count - offset), offset=offset)
+            if not batch["ids"]:
+                break
+            embeddings = _normalize(batch["embeddings"])
+            if arrays is None:
+                dim = embeddings.shape[1]
+                arrays = self._open_arrays(tmp_dir, "w+", capacity, dim)
+            offset = self._write_rows(arrays, offset, embeddings)
+            ids.extend(batch["ids"])
+
+        if arrays is not None:
+            for array in arrays.values():
+                array.flush()
+        del arrays
+
+        with open(os.path.join(tmp_dir, "ids.txt"), "w", encoding="utf-8") as f:
+            f.writelines(f"{doc_id}\n" for doc_id in ids)
+        self._write_meta(tmp_dir, {
+            "format": FORMAT_VERSION,
+            "collection": collection.name,
+            "count": len(ids),
+            "capacity": capacity if dim else 0,
+            "dim": dim,
+            "ids_bytes": os.path.getsize(os.path.join(tmp_dir, "ids.txt")),
+            "quantization": self.quantization,
+            "built_at": time.time(),
+        })
+
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.replace(tmp_dir, self.directory)
+        return self.load()
+
+    def _grow(self, meta, count, chunk_size=65536):
+        """Moves the index into files with room for at least count rows (doubling capacity)."""
+        capacity = max(count, 2 * meta["capacity"])
+        tmp_dir = f"{self.directory}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        old = self._open_arrays(self.directory, "r")
+        new = self._open_arrays(tmp_dir, "w+", capacity, meta["dim"])
+        for name, array in new.items():
+            for start in range(0, meta["count"], chunk_size):
+                end = min(start + chunk_size, meta["count"])
+                array[start:end] = old[name][start:end]
+            array.flush()
+        del old, new
+
+        shutil.copyfile(os.path.join(self.directory, "ids.txt"), os.path.join(tmp_dir, "ids.txt"))
+        self._write_meta(tmp_dir, {**meta, "capacity": capacity})
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.replace(tmp_dir, self.directory)
+        return self._read_meta()
+
+    def update(self, collection, quantization, batch_size=1000):
+        """Brings the index up to date with the collection by appending new rows.
+
+        Chroma returns records in insertion order, so chunks ingested since
+        the last build/update are the rows past the indexed count; only
+        those are read and quantised. Rows beyond the stored count are never
+        read, so other readers of the same files are unaffected until the
+        new count is published in meta.json. Returns False when a full
+        build() is needed instead (new collection version, quantization or
+        index format, or rows that were not purely appended).
+        """
+        meta = self._read_meta() if self.exists() else None
+        count = collection.count()
+        if (
+            meta is None
+            or meta.get("format") != FORMAT_VERSION
+            or meta["collection"] != collection.name
+            or meta["quantization"] != quantization
+            or not meta["count"]
+            or count < meta["count"]
+        ):
+            return False
+        if count == meta["count"]:
+            if self.meta is None or self.meta["count"] != count:
+                self.load()
+            return True
+
+        self.load()
+        # The last indexed chunk must still sit at the same offset for this to be an append
+        last = collection.get(include=[], limit=1, offset=meta["count"] - 1)["ids"]
+        if last != self.ids[-1:]:
+            return False
+        if count > meta["capacity"]:
+            meta = self._grow(meta, count)
+
+        arrays = self._open_arrays(self.directory, "r+")
+        new_ids = []
+        offset = meta["count"]
+        while offset < count:
+            batch = collection.get(include=["embeddings"], limit=min(batch_size, count - offset), offset=offset)
+            if not batch["ids"]:
+                break
+            offset = self._write_rows(arrays, offset, _normalize(batch["embeddings"]))
+            new_ids.extend(batch["ids"])
+        for array in arrays.values():
+            array.flush()
+        del arrays
+
+        # Truncate first: an interrupted update may have left unpublished ids behind
+        with open(os.path.join(self.directory, "ids.txt"), "r+b") as f:
+            f.truncate(meta["ids_bytes"])
+            f.seek(0, os.SEEK_END)
+            f.write("".join(f"{doc_id}\n" for doc_id in new_ids).encode("utf-8"))
+            ids_bytes = f.tell()
+        self._write_meta(self.directory, {
+            **meta, "count": offset, "ids_bytes": ids_bytes, "built_at": time.time()
+        })
+        return self.load() is not None
+
+    # --- Loading ---
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.directory, "meta.json"))
+
+    def _read_meta(self):
+        with open(os.path.join(self.directory, "meta.json"), "r") as f:
+            return json.load(f)
+
+    def load(self):
+        self.meta = self._read_meta()
+        count = self.meta["count"]
+        with open(os.path.join(self.directory, "ids.txt"), "r", encoding="utf-8") as f:
+            self.ids = [line.rstrip("\n") for _, line in zip(range(count), f)]
+        self._rows = None
+        self.quantization = self.meta["quantization"]
+        self.vectors = self.codes = self.scales = None
+        if count:
+            # Slicing keeps the arrays memory-mapped; rows past count are spare capacity
+            arrays = self._open_arrays(self.directory, "r")
+            self.vectors = arrays["vectors"][:count]
+            self.codes = arrays["codes"][:count]
+            if self.quantization == "int8":
+                self.scales = arrays["scales"][:count]
+        return self
+
+    def close(self):
+        self.meta = self.ids = self.vectors = self.codes = self.scales = self._rows = None
+
+    # --- Searching ---
+
+    def row_of(self, doc_id):
+        if self._rows is None:
+            self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        return self._rows.get(doc_id)
+
+    def _first_pass(self, query, num_candidates, rows=None, chunk_size=65536):
+        """Approximate scores over every row (or only `rows`), keeping the best num_candidates rows."""
+        if self.quantization == "binary":
+            query_bits = quantize_binary(query[None, :])[0]
+
+        total = len(self.ids) if rows is None else len(rows)
+        best_rows, best_scores = [], []
+        for start in range(0, total, chunk_size):
+            if rows is None:
+                chunk_rows = np.arange(start, min(start + chunk_size, total))
+                codes = self.codes[start:start + chunk_size]
+                scales = self.scales[start:start + chunk_size] if self.scales is not None else None
+            else:
+                chunk_rows = rows[start:start + chunk_size]
+                codes = self.codes[chunk_rows]
+                scales = self.scales[chunk_rows] if self.scales is not None else None
+
+            if self.quantization == "int8":
+                scores = (codes.astype(np.float32) @ query) * scales
+            else:
+                scores = -_POPCOUNT[np.bitwise_xor(codes, query_bits)].sum(axis=1, dtype=np.int32)
+            keep = min(num_candidates, len(scores))
+            top = np.argpartition(-scores, keep - 1)[:keep]
+            best_rows.append(chunk_rows[top])
+            best_scores.append(scores[top])
+
+        rows = np.concatenate(best_rows)
+        scores = np.concatenate(best_scores).astype(np.float32)
+        keep = min(num_candidates, len(rows))
+        return rows[np.argpartition(-scores, keep - 1)[:keep]]
+
+    def search(self, query_vector, k=5, rescore_factor=None, rows=None):
+        """Returns [(id, cosine similarity)] for the top-k rows.
+
+        The quantised first pass shortlists k * rescore_factor candidates,
+        which are then re-scored exactly against the float32 vectors. When
+        rows is given only those rows are scanned.
+        """
+        if rows is not None:
+            rows = np.unique(np.asarray(rows, dtype=np.int64))
+        if not self.ids or (rows is not None and len(rows) == 0):
+            return []
+        rescore_factor = rescore_factor or DEFAULT_RESCORE_FACTOR[self.quantization]
+        query = _normalize(query_vector)
+        candidates = np.sort(self._first_pass(query, k * rescore_factor, rows))
+        exact = self.vectors[candidates] @ query
+        order = np.argsort(-exact)[:k]
+        return [(self.ids[candidates[i]], float(exact[i])) for i in order]
+
+    def exact_search(self, query_vector, k=5, chunk_size=65536):
+        """Brute-force float32 search, used as ground truth for recall."""
+        query = _normalize(query_vector)
+        scores = np.concatenate([
+            self.vectors[start:start + chunk_size] @ query
+            for start in range(0, len(self.ids), chunk_size)
+        ])
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+    # --- Reporting ---
+
+    def memory_report(self):
+        count, dim = self.meta["count"], self.meta["dim"]
+        float_bytes = count * dim * 4
+        code_bytes = int(self.codes.nbytes) if self.codes is not None else 0
+        if self.scales is not None:
+            code_bytes += int(self.scales.nbytes)
+        return {
+            "count": count,
+            "dim": dim,
+            "quantization": self.quantization,
+            "float32_mb": float_bytes / 1e6,
+            "compact_mb": code_bytes / 1e6,
+            "compression": float_bytes / max(code_bytes, 1),
+        }
+
+    def evaluate_recall(self, k=5, num_queries=100, rescore_factor=None, seed=0):
+        """Average recall@k of search() against exact_search() on sampled stored vectors.
+
+        Each sampled query is excluded from its own results so it cannot
+        trivially match itself.
+        """
+        if not self.ids:
+            return {"recall": 1.0, "queries": 0}
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(len(self.ids), size=min(num_queries, len(self.ids)), replace=False)
+        recalls = []
+        for row in rows:
+            query, query_id = np.asarray(self.vectors[row]), self.ids[row]
+            expected = [i for i, _ in self.exact_search(query, k + 1) if i != query_id][:k]
+            found = [i for i, _ in self.search(query, k + 1, rescore_factor) if i != query_id][:k]
+            recalls.append(len(set(expected) & set(found)) / max(len(expected), 1))
+        return {"recall": float(np.mean(recalls)), "queries": len(rows)}
@@ -0,0 +1,155 @@
+"""Context assembly between retrieval and the LLM.
+
+Retrieved chunks from the same document page that touch or overlap (the
+splitter overlaps neighbours by 200 characters) are merged so the shared
+text is sent once. The merged passages are then packed by relevance until a
+per-model token budget is reached.
+"""
+import os
+
+from langchain_core.documents import Document
+
+# Context tokens per answer, kept below the ~1250 tokens the previous five
+# unpacked 1000-character chunks cost; local models pay for every prompt
+# token in latency
+DEFAULT_TOKEN_BUDGETS = {
+    "Gemini": 1200,
+    "Ollama": 1000,
+}
+DEFAULT_TOKEN_BUDGET = 1200
+
+# Shortest suffix/prefix match treated as a real overlap between two chunks
+MIN_OVERLAP = 20
+MAX_OVERLAP = 400
+# Chunks separated by at most this many characters (the whitespace the
+# splitter strips between them) count as adjacent
+MAX_GAP = 4
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token), cheap enough to run on every query."""
+    return max(1, len(text) // 4)
+
+
+def get_token_budget(model_provider):
+    budget = os.getenv("CONTEXT_TOKEN_BUDGET")
+    if budget:
+        return int(budget)
+    return DEFAULT_TOKEN_BUDGETS.get(model_provider, DEFAULT_TOKEN_BUDGET)
+
+
+def _group_key(document):
+    metadata = document.metadata
+    return metadata.get("doc_id") or metadata.get("source"), metadata.get("page")
+
+
+def _text_overlap(left, right):
+    """Length of the longest suffix of left that is a prefix of right (0 if shorter than MIN_OVERLAP)."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge_positioned(items):
+    """Merges (rank, document) pairs that carry a start_index, in document order."""
+    items = sorted(items, key=lambda item: item[1].metadata["start_index"])
+    merged = []
+    for rank, document in items:
+        start = document.metadata["start_index"]
+        end = start + len(document.page_content)
+        if merged:
+            current = merged[-1]
+            if start <= current["end"] + MAX_GAP:
+                if start >= current["end"]:
+                    current["text"] += "\n" + document.page_content
+                else:
+                    current["text"] += document.page_content[current["end"] - start:]
+                current["end"] = max(current["end"], end)
+                current["rank"] = min(current["rank"], rank)
+                current["count"] += 1
+                if rank == current["rank"]:
+                    current["metadata"] = document.metadata
+                continue
+        merged.append({"end": end, "text": document.page_content, "rank": rank,
+                       "metadata": document.metadata, "count": 1})
+    return merged
+
+
+def _merge_by_text(items):
+    """Merges (rank, document) pairs without positions by detecting overlapping text."""
+    merged = [{"text": document.page_content, "rank": rank,
+               "metadata": document.metadata, "count": 1} for rank, document in items]
+    changed = True
+    while changed:
+        changed = False
+        for left in merged:
+            for right in merged:
+                if left is right:
+                    continue
+                overlap = _text_overlap(left["text"], right["text"])
+                if overlap or right["text"] in left["text"]:
+                    if overlap:
+                        left["text"] += right["text"][overlap:]
+                    if right["rank"] < left["rank"]:
+                        left["rank"], left["metadata"] = right["rank"], right["metadata"]
+                    left["count"] += right["count"]
+                    merged.remove(right)
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+def merge_adjacent(documents):
+    """Merges adjacent or overlapping chunks of the same document page.
+
+    Returns passages as dicts (text, rank, metadata, count), where rank is
+    the best retrieval rank of the chunks merged into the passage.
+    """
+    groups = {}
+    for rank, document in enumerate(documents):
+        groups.setdefault(_group_key(document), []).append((rank, document))
+
+    passages = []
+    for items in groups.values():
+        positioned = [item for item in items if isinstance(item[1].metadata.get("start_index"), int)]
+        unpositioned = [item for item in items if not isinstance(item[1].metadata.get("start_index"), int)]
+        passages.extend(_merge_positioned(positioned))
+        passages.extend(_merge_by_text(unpositioned))
+    return passages
+
+
+def pack_context(documents, token_budget):
+    """Merges retrieved chunks and keeps the most relevant passages that fit the budget.
+
+    Returns (documents, report). The best passage is always kept, truncated
+    if it alone exceeds the budget.
+    """
+    passages = sorted(merge_adjacent(documents), key=lambda p: p["rank"])
+
+    packed = []
+    used = 0
+    for passage in passages:
+        tokens = estimate_tokens(passage["text"])
+        if used + tokens > token_budget:
+            if packed:
+                continue
+            passage["text"] = passage["text"][:token_budget * 4]
+            tokens = estimate_tokens(passage["text"])
+        packed.append(Document(
+            page_content=passage["text"],
+            metadata={**passage["metadata"], "merged_chunks": passage["count"]}
+        ))
+        used += tokens
+
+    report = {
+        "retrieved_chunks": len(documents),
+        "merged_passages": len(passages),
+        "packed_passages": len(packed),
+        "retrieved_tokens": sum(estimate_tokens(d.page_content) for d in documents),
+        "context_tokens": used,
+        "token_budget": token_budget,
+    }
+    return packed, report
@@ -1,50 +1,749 @@
-import chromadb
+import json
 import os
+import shutil
+import threading
+import time
 import warnings
 
 # Suppress PyTorch warnings
 warnings.filterwarnings('ignore', message='.*torch.classes.*')
 
-from langchain_chroma import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_huggingface import HuggingFaceEmbeddings
-import streamlit as st
+# chromadb, LangChain integrations, NumPy and the embedding models are imported
+# where they are first used, so pages that never search stay fast to load.
+
+# Chroma's own HNSW defaults, used until a collection is configured otherwise
+DEFAULT_HNSW_PARAMS = {
+    "space": "l2",
+    "M": 16,
+    "construction_ef": 100,
+    "search_ef": 10,
+}
+HNSW_SPACES = ["l2", "cosine", "ip"]
+
+GEMINI_EMBEDDING_MODEL = "models/embedding-001"
+
+# "chroma" searches the HNSW index; "compact" searches a quantised CompactIndex
+RETRIEVAL_BACKENDS = ["chroma", "compact"]
+# Defined here rather than in utils.compact_index / utils.dedup so the Settings
+# page can list them without importing NumPy
+QUANTIZATIONS = ["int8", "binary"]
+DEDUP_MODES = ["off", "skip", "link"]
+
+# Held while writing to a collection or switching it to a new version, so no
+# chunk can be added to a version that is about to be retired.
+_WRITE_LOCK = threading.RLock()
+# Background re-embedding jobs, keyed by logical collection name
+_REEMBED_JOBS = {}
+# The one build (rebuild, re-embed or snapshot import) running per logical
+# collection; a second one is refused while it runs
+_BUILDS = {}
+# One lazily loaded embedding model per model id, shared by every DBManager
+_EMBEDDINGS = {}
+_EMBEDDINGS_LOCK = threading.Lock()
+# Serializes compact index (re)builds; concurrent multi-query searches would
+# otherwise build the same index at once
+_COMPACT_LOCK = threading.Lock()
+
+
+class LazyEmbeddings:
+    """Embeddings wrapper that loads the underlying model on the first embed call."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._embeddings = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = self._factory()
+        return self._embeddings
+
+    def embed_documents(self, texts, *args, **kwargs):
+        return self._load().embed_documents(texts, *args, **kwargs)
+
+    def embed_query(self, text, *args, **kwargs):
+        return self._load().embed_query(text, *args, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+
+def _catalog_add(catalog, metadata):
+    """Counts one chunk towards its document's catalog entry."""
+    key = metadata.get("doc_id") or metadata.get("source", "Unknown")
+    item = catalog.setdefault(key, {
+        "key": key,
+        "doc_id": metadata.get("doc_id"),
+        "source": metadata.get("source", "Unknown"),
+        "file_type": metadata.get("file_type"),
+        "ingest_date": metadata.get("ingest_date"),
+        "pages": 0,
+        "chunks": 0,
+    })
+    item["chunks"] += 1
+    if isinstance(metadata.get("page"), int):
+        item["pages"] = max(item["pages"], metadata["page"] + 1)
+
 
 class DBManager:
-    def __init__(self, persist_directory="./data/chroma_db"):
+    """Manages Chroma collections.
+
+    Callers address collections by a logical name (e.g. "documents"). Each
+    logical collection points at one physical Chroma collection, its active
+    version, which is always embedded with a single embedding model recorded
+    in the config file.
+    """
+
+    def __init__(self, persist_directory="./data/chroma_db", config_file="./data/collections.json",
+                 compact_directory="./data/compact_index", dedup_directory="./data/lsh"):
         self.persist_directory = persist_directory
-        self.client = chromadb.PersistentClient(path=persist_directory)
+        self.config_file = config_file
+        self.compact_directory = compact_directory
+        self.dedup_directory = dedup_directory
+        self._client = None
+        self._stores = {}
+        self._compact_indexes = {}
 
-    def get_embedding_function(self):
+    @property
+    def client(self):
+        if self._client is None:
+            import chromadb
+            self._client = chromadb.PersistentClient(path=self.persist_directory)
+        return self._client
+
+    @staticmethod
+    def get_embedding_model_id():
+        """Identifies the embedding model currently configured in the environment."""
         # Use local Sentence Transformers by default (no API limits)
         # Only use Gemini if explicitly configured
         use_gemini = os.getenv("USE_GEMINI_EMBEDDINGS", "false").lower() == "true"
-        api_key = os.getenv("GOOGLE_API_KEY")
-        
-        if use_gemini and api_key:
-            return GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=api_key)
+        if use_gemini and os.getenv("GOOGLE_API_KEY"):
+            return f"gemini:{GEMINI_EMBEDDING_MODEL}"
+        # Use a lightweight, high-quality default model (no quota limits)
+        return f"huggingface:{os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')}"
+
+    def get_embedding_function(self, model_id=None):
+        """Returns the (lazily loaded) embeddings for a model id; only that provider's SDK is imported."""
+        model_id = model_id or self.get_embedding_model_id()
+        provider, model_name = model_id.split(":", 1)
+
+        if provider == "gemini":
+            api_key = os.getenv("GOOGLE_API_KEY")
+            if not api_key:
+                raise ValueError("Google API Key not found.")
+
+            def factory():
+                from langchain_google_genai import GoogleGenerativeAIEmbeddings
+                return GoogleGenerativeAIEmbeddings(model=model_name, google_api_key=api_key)
+        elif provider == "huggingface":
+            def factory():
+                from langchain_huggingface import HuggingFaceEmbeddings
+                return HuggingFaceEmbeddings(model_name=model_name, model_kwargs={'device': 'cpu'})
         else:
-            # Use a lightweight, high-quality default model (no quota limits)
-            model_name = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
-            return HuggingFaceEmbeddings(model_name=model_name, model_kwargs={'device': 'cpu'})
-
-    def get_vector_store(self, collection_name="documents"):
-        embedding_function = self.get_embedding_function()
-        return Chroma(
-            client=self.client,
-            collection_name=collection_name,
-            embedding_function=embedding_function,
+            raise ValueError(f"Unknown embedding model '{model_id}'")
+
+        with _EMBEDDINGS_LOCK:
+            if model_id not in _EMBEDDINGS:
+                _EMBEDDINGS[model_id] = LazyEmbeddings(factory)
+            return _EMBEDDINGS[model_id]
+
+    def get_vector_store(self, collection_name="documents", embedding_model=None):
+        """Returns a vector store bound to the active version of a collection.
+
+        The store always embeds with the model the collection was built with.
+        Asking for any other model raises instead of mixing vectors.
+        """
+        entry = self._get_entry(collection_name)
+        if embedding_model and embedding_model != entry["embedding_model"]:
+            raise ValueError(
+                f"Collection '{collection_name}' is embedded with '{entry['embedding_model']}', "
+                f"not '{embedding_model}'. Re-embed it instead of mixing models."
+            )
+
+        key = (entry["active"], entry["embedding_model"])
+        if key not in self._stores:
+            from langchain_chroma import Chroma
+            self._stores[key] = Chroma(
+                client=self.client,
+                collection_name=entry["active"],
+                embedding_function=self.get_embedding_function(entry["embedding_model"]),
+                collection_metadata=self._hnsw_metadata(entry["hnsw"]),
+            )
+        return self._stores[key]
+
+    @staticmethod
+    def get_retrieval_backend():
+        return os.getenv("RETRIEVAL_BACKEND", "chroma")
+
+    def get_retriever(self, collection_name="documents", k=5, backend=None, where=None, query_variants=None):
+        """Returns a retriever over a collection.
+
+        where is a Chroma metadata filter (see utils.filters.build_where). It
+        is pushed down into the search so only matching chunks are ranked.
+
+        query_variants(question) -> [queries] turns on multi-query retrieval:
+        the variants are embedded in one batch, searched concurrently and
+        their results fused (see utils.retrievers.FanOutRetriever).
+        """
+        backend = backend or self.get_retrieval_backend()
+        vector_store = self.get_vector_store(collection_name)
+        if backend == "chroma":
+            if query_variants is None:
+                search_kwargs = {"k": k}
+                if where:
+                    search_kwargs["filter"] = where
+                return vector_store.as_retriever(search_kwargs=search_kwargs)
+            search_by_vector = lambda vector, k: vector_store.similarity_search_by_vector(vector, k=k, filter=where)
+        elif backend == "compact":
+            search_by_vector = lambda vector, k: self._compact_search(collection_name, vector, k, where)
+        else:
+            raise ValueError(f"Invalid retrieval backend '{backend}'. Use one of {RETRIEVAL_BACKENDS}.")
+
+        if query_variants is None:
+            from utils.retrievers import VectorSearchRetriever
+            return VectorSearchRetriever(embedding_function=vector_store.embeddings, search_by_vector=search_by_vector, k=k)
+
+        from utils.retrievers import FanOutRetriever
+        return FanOutRetriever(
+            embed_queries=lambda queries: self._embed_queries(collection_name, vector_store.embeddings, queries),
+            search_by_vector=search_by_vector,
+            query_variants=query_variants,
+            k=k
         )
 
+    def _embed_queries(self, collection_name, embeddings, queries):
+        """Embeds several queries in one request/batch.
+
+        Sentence-transformers encode queries and documents the same way, so
+        embed_documents batches them. Gemini embeds queries with a different
+        task type, which its embed_documents accepts as an argument.
+        """
+        if len(queries) == 1:
+            return [embeddings.embed_query(queries[0])]
+        if self.get_collection_embedding_model(collection_name).startswith("gemini:"):
+            return embeddings.embed_documents(queries, task_type="retrieval_query")
+        return embeddings.embed_documents(queries)
+
+    def get_compact_index(self, collection_name="documents", quantization=None, rebuild=False):
+        """Returns the compact index of a collection, (re)building it if it is out of date.
+
+        The index covers the active version only. Chunks ingested since the
+        last call are appended; it is rebuilt when the collection switches
+        version.
+        """
+        from utils.compact_index import CompactIndex
+
+        quantization = quantization or os.getenv("COMPACT_QUANTIZATION", "int8")
+        collection = self._get_active_collection(collection_name)
+        with _COMPACT_LOCK:
+            index = self._compact_indexes.get(collection_name)
+            if index is None:
+                index = CompactIndex(os.path.join(self.compact_directory, collection_name), quantization)
+            # Newly ingested chunks are appended; a full build only follows a version
+            # switch or quantization change
+            if rebuild or not index.update(collection, quantization):
+                index = CompactIndex(os.path.join(self.compact_directory, collection_name), quantization)
+                index.build(collection)
+            self._compact_indexes[collection_name] = index
+        return index
+
+    def get_compact_index_report(self, collection_name="documents", k=5, num_queries=100, quantization=None, rebuild=False):
+        """Memory footprint of the compact index and its recall@k against exact search.
+
+        quantization and rebuild are passed to get_compact_index, so the report
+        describes the index just built rather than the one in the environment.
+        """
+        index = self.get_compact_index(collection_name, quantization=quantization, rebuild=rebuild)
+        report = index.memory_report()
+        recall = index.evaluate_recall(k=k, num_queries=num_queries)
+        report[f"recall@{k}"] = recall["recall"]
+        report["recall_loss"] = 1.0 - recall["recall"]
+        return report
+
+    def _compact_search(self, collection_name, vector, k, where=None):
+        from langchain_core.documents import Document
+
+        index = self.get_compact_index(collection_name)
+        collection = self._get_active_collection(collection_name)
+        rows = None
+        if where:
+            # Resolve the filter to index rows first so only those are scanned
+            matching = collection.get(where=where, include=[])["ids"]
+            rows = [row for row in map(index.row_of, matching) if row is not None]
+        hits = index.search(vector, k, rows=rows)
+        if not hits:
+            return []
+        records = collection.get(
+            ids=[doc_id for doc_id, _ in hits],
+            include=["documents", "metadatas"]
+        )
+        by_id = {
+            doc_id: Document(page_content=content, metadata=metadata or {})
+            for doc_id, content, metadata in zip(records["ids"], records["documents"], records["metadatas"])
+        }
+        return [by_id[doc_id] for doc_id, _ in hits if doc_id in by_id]
+
+    def add_documents(self, documents, collection_name="documents", ids=None, embeddings=None):
+        """Embeds and stores documents; with embeddings, stores those vectors instead of embedding."""
+        with _WRITE_LOCK:
+            if embeddings is None:
+                ids = self.get_vector_store(collection_name).add_documents(documents, ids=ids)
+            else:
+                self._get_active_collection(collection_name).add(
+                    ids=ids,
+                    embeddings=embeddings,
+                    documents=[d.page_content for d in documents],
+                    metadatas=[d.metadata for d in documents]
+                )
+            config = self._load_config()
+            catalog = config[collection_name].get("catalog")
+            # Without a catalog, list_documents() builds one from the collection
+            if catalog is not None:
+                for document in documents:
+                    _catalog_add(catalog, document.metadata)
+                self._save_config(config)
+            return ids
+
+    def get_chunks(self, chunk_ids, collection_name="documents"):
+        """Maps stored chunk ids to (metadata, embedding); unknown ids are left out."""
+        if not chunk_ids:
+            return {}
+        found = self._get_active_collection(collection_name).get(
+            ids=list(chunk_ids), include=["metadatas", "embeddings"]
+        )
+        return {
+            chunk_id: (metadata or {}, list(embedding))
+            for chunk_id, metadata, embedding in zip(found["ids"], found["metadatas"], found["embeddings"])
+        }
+
+    def _dedup_path(self, collection_name):
+        return os.path.join(self.dedup_directory, f"{collection_name}.sqlite")
+
+    def get_dedup_index(self, collection_name="documents", batch_size=1000):
+        """Returns the near-duplicate index of a collection.
+
+        An empty index over a non-empty collection (e.g. one ingested before
+        deduplication existed) is first backfilled from the stored chunk text.
+        """
+        from utils.dedup import NearDuplicateIndex
+
+        index = NearDuplicateIndex(self._dedup_path(collection_name))
+        with index.connect() as conn:
+            if index.count(conn) == 0:
+                collection = self._get_active_collection(collection_name)
+                offset = 0
+                while True:
+                    batch = collection.get(include=["documents"], limit=batch_size, offset=offset)
+                    if not batch["ids"]:
+                        break
+                    for chunk_id, text in zip(batch["ids"], batch["documents"]):
+                        index.add(conn, chunk_id, index.signature(text or ""))
+                    offset += len(batch["ids"])
+        return index
+
+    def get_dedup_stats(self, collection_name="documents"):
+        """Cumulative near-duplicate savings: duplicates, embed_seconds_saved, bytes_saved."""
+        if not os.path.exists(self._dedup_path(collection_name)):
+            return {}
+        from utils.dedup import NearDuplicateIndex
+        return NearDuplicateIndex(self._dedup_path(collection_name)).get_stats()
+
+    def get_duplicate_sources(self, chunk_ids, collection_name="documents"):
+        """Maps chunk ids to other documents where a linked near-duplicate was found."""
+        if not os.path.exists(self._dedup_path(collection_name)):
+            return {}
+        from utils.dedup import NearDuplicateIndex
+        return NearDuplicateIndex(self._dedup_path(collection_name)).get_links(chunk_ids)
+
+    def get_embedding_dimension(self, collection_name="documents"):
+        collection = self._get_active_collection(collection_name)
+        peek = collection.get(include=["embeddings"], limit=1)
+        if peek["ids"]:
+            return len(peek["embeddings"][0])
+        return None
+
+    def list_documents(self, collection_name="documents", batch_size=1000):
+        """Returns one entry per ingested document: key, doc_id, source, file_type, pages, chunks.
+
+        Served from a catalog kept in the config file, which is rebuilt from the
+        chunk metadata when missing (e.g. after an import or for old collections).
+        """
+        catalog = self._load_config().get(collection_name, {}).get("catalog")
+        if catalog is None:
+            # Scanned under the write lock: add_documents() skips the catalog while
+            # it is missing, so chunks stored during an unlocked scan would never
+            # be counted
+            with _WRITE_LOCK:
+                collection = self._get_active_collection(collection_name)
+                config = self._load_config()
+                catalog = config[collection_name].get("catalog")
+                if catalog is None:
+                    catalog = {}
+                    offset = 0
+                    while True:
+                        batch = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+                        if not batch["ids"]:
+                            break
+                        for metadata in batch["metadatas"]:
+                            _catalog_add(catalog, metadata or {})
+                        offset += len(batch["ids"])
+                    config[collection_name]["catalog"] = catalog
+                    self._save_config(config)
+        return sorted(catalog.values(), key=lambda d: d["source"])
+
     def get_collection_stats(self, collection_name="documents"):
-        try:
-            collection = self.client.get_collection(collection_name)
-            return {
-                "count": collection.count(),
-                "peek": collection.peek()
-            }
-        except ValueError:
+        collection = self._get_collection(self.get_active_collection_name(collection_name))
+        if collection is None:
             return {"count": 0, "peek": None}
+        return {
+            "count": collection.count(),
+            "peek": collection.peek()
+        }
 
     def reset_db(self):
         self.client.reset()
+        self._stores = {}
+        self._compact_indexes = {}
+        shutil.rmtree(self.compact_directory, ignore_errors=True)
+        shutil.rmtree(self.dedup_directory, ignore_errors=True)
+        # Keep tuning choices, but let the next collection follow the configured model
+        config = self._load_config()
+        for name, entry in config.items():
+            config[name] = {"hnsw": entry.get("hnsw", {})}
+        self._save_config(config)
+
+    # --- Collection configuration ---
+
+    def _load_config(self):
+        if os.path.exists(self.config_file):
+            try:
+                with open(self.config_file, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                return {}
+        return {}
+
+    def _save_config(self, config):
+        os.makedirs(os.path.dirname(self.config_file) or ".", exist_ok=True)
+        # Write to a temp file first so a crash never leaves a half-written config
+        tmp_file = f"{self.config_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(config, f, indent=2)
+        os.replace(tmp_file, self.config_file)
+
+    def _get_entry(self, collection_name):
+        config = self._load_config()
+        entry = config.get(collection_name, {})
+        if "active" not in entry:
+            # Unversioned collection (created before versioning, or not yet
+            # created): adopt it as version 1 of the configured model.
+            entry = {
+                "active": collection_name,
+                "version": 1,
+                "embedding_model": self.get_embedding_model_id(),
+                "hnsw": entry.get("hnsw", {}),
+            }
+            config[collection_name] = entry
+            self._save_config(config)
+        entry["hnsw"] = {**DEFAULT_HNSW_PARAMS, **entry.get("hnsw", {})}
+        return entry
+
+    def get_active_collection_name(self, collection_name="documents"):
+        return self._get_entry(collection_name)["active"]
+
+    def _get_active_collection(self, collection_name):
+        entry = self._get_entry(collection_name)
+        return self.client.get_or_create_collection(entry["active"], metadata=self._hnsw_metadata(entry["hnsw"]))
+
+    def get_collection_embedding_model(self, collection_name="documents"):
+        return self._get_entry(collection_name)["embedding_model"]
+
+    def get_hnsw_params(self, collection_name="documents"):
+        stored = self._load_config().get(collection_name, {}).get("hnsw", {})
+        return {**DEFAULT_HNSW_PARAMS, **stored}
+
+    @staticmethod
+    def _validate_hnsw_params(params):
+        if params["space"] not in HNSW_SPACES:
+            raise ValueError(f"Invalid HNSW space '{params['space']}'. Use one of {HNSW_SPACES}.")
+        for key in ("M", "construction_ef", "search_ef"):
+            if int(params[key]) < 1:
+                raise ValueError(f"HNSW parameter '{key}' must be a positive integer.")
+            params[key] = int(params[key])
+        return params
+
+    @staticmethod
+    def _hnsw_metadata(params):
+        return {f"hnsw:{key}": value for key, value in params.items()}
+
+    def set_hnsw_params(self, collection_name="documents", **params):
+        """Stores new HNSW parameters and rebuilds the collection if they changed.
+
+        HNSW settings are fixed when Chroma creates a collection, so an existing
+        collection is copied into a new version built with the new parameters.
+        Returns True if a rebuild was performed.
+        """
+        entry = self._get_entry(collection_name)
+        new_params = self._validate_hnsw_params({**entry["hnsw"], **params})
+        if new_params == entry["hnsw"]:
+            return False
+
+        if self._get_collection(entry["active"]) is not None:
+            self.rebuild_collection(collection_name, new_params)
+            return True
+
+        config = self._load_config()
+        config[collection_name]["hnsw"] = new_params
+        self._save_config(config)
+        return False
+
+    def _get_collection(self, collection_name):
+        try:
+            return self.client.get_collection(collection_name)
+        except Exception:
+            return None
+
+    def rebuild_collection(self, collection_name, hnsw_params, batch_size=1000):
+        """Copies a collection (stored embeddings included) into a version with new HNSW params."""
+        self._begin_build(collection_name, "rebuild")
+        try:
+            return self._build_new_version(collection_name, hnsw_params=hnsw_params, batch_size=batch_size)
+        finally:
+            self._end_build(collection_name)
+
+    @staticmethod
+    def _begin_build(collection_name, kind):
+        """Registers a build of a new version; raises if another one is running."""
+        with _WRITE_LOCK:
+            running = _BUILDS.get(collection_name)
+            if running is not None:
+                raise ValueError(f"A {running['kind']} of '{collection_name}' is already running; try again when it finishes.")
+            _BUILDS[collection_name] = {"kind": kind, "started_at": time.time()}
+
+    @staticmethod
+    def _end_build(collection_name):
+        with _WRITE_LOCK:
+            _BUILDS.pop(collection_name, None)
+
+    @staticmethod
+    def get_running_build(collection_name="documents"):
+        """The build (kind: rebuild, re-embed or import) currently running on a collection, or None."""
+        return _BUILDS.get(collection_name)
+
+    def _build_new_version(self, collection_name, hnsw_params=None, embedding_model=None,
+                           batch_size=1000, job=None):
+        """Builds the next version of a collection and atomically makes it active.
+
+        Records are copied from the active version in batches while it keeps
+        serving queries. When embedding_model differs from the active one the
+        chunk text is re-embedded, otherwise stored embeddings are reused.
+        Chunks ingested during the copy are copied under the write lock right
+        before the switch. A failure leaves the active version untouched.
+        Callers register the build with _begin_build() first.
+        """
+        entry = self._get_entry(collection_name)
+        hnsw_params = hnsw_params or entry["hnsw"]
+        embedding_model = embedding_model or entry["embedding_model"]
+        embedding_function = None
+        if embedding_model != entry["embedding_model"]:
+            embedding_function = self.get_embedding_function(embedding_model)
+
+        source = self._get_active_collection(collection_name)
+        target, version = self._create_next_version(collection_name, hnsw_params)
+
+        offset = 0
+        try:
+            # Each unlocked pass stops at the count seen when it started, so
+            # steady ingest cannot keep it running; a few passes shrink the delta
+            for _ in range(3):
+                until = source.count()
+                if until - offset <= batch_size:
+                    break
+                offset = self._copy_batches(source, target, offset, embedding_function, batch_size, job, until)
+            with _WRITE_LOCK:
+                # Copy what was ingested meanwhile (a small delta by now) while
+                # writers are blocked, so the switch cannot be outrun by ingest
+                offset = self._copy_batches(source, target, offset, embedding_function, batch_size, job)
+                if self._load_config()[collection_name]["active"] != entry["active"]:
+                    raise ValueError(f"'{collection_name}' switched version during the build; nothing was changed.")
+                self._activate_version(collection_name, target.name, version, embedding_model, hnsw_params)
+        except Exception:
+            self.client.delete_collection(target.name)
+            raise
+
+        self.client.delete_collection(entry["active"])
+        return offset
+
+    def _create_next_version(self, collection_name, hnsw_params):
+        """Creates an empty collection for the next version under a name no collection has.
+
+        Existing collections are never reused or deleted here; a leftover of
+        an interrupted build just makes the version number skip ahead.
+        """
+        with _WRITE_LOCK:
+            version = self._get_entry(collection_name)["version"] + 1
+            while self._get_collection(f"{collection_name}__v{version}") is not None:
+                version += 1
+            target = self.client.create_collection(
+                f"{collection_name}__v{version}", metadata=self._hnsw_metadata(hnsw_params)
+            )
+        return target, version
+
+    def _activate_version(self, collection_name, target_name, version, embedding_model, hnsw_params):
+        """Points a logical collection at a new physical version. Call with _WRITE_LOCK held."""
+        config = self._load_config()
+        config[collection_name] = {
+            **config.get(collection_name, {}),
+            "active": target_name,
+            "version": version,
+            "embedding_model": embedding_model,
+            "hnsw": hnsw_params,
+        }
+        self._save_config(config)
+        self._stores = {}
+
+    @staticmethod
+    def _copy_batches(source, target, offset, embedding_function, batch_size, job, until=None):
+        while until is None or offset < until:
+            batch = source.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=batch_size if until is None else min(batch_size, until - offset),
+                offset=offset
+            )
+            if not batch["ids"]:
+                return offset
+
+            embeddings = batch["embeddings"]
+            if embedding_function is not None:
+                embeddings = embedding_function.embed_documents(batch["documents"])
+            target.add(
+                ids=batch["ids"],
+                embeddings=embeddings,
+                documents=batch["documents"],
+                metadatas=batch["metadatas"]
+            )
+            offset += len(batch["ids"])
+            if job is not None:
+                job["done"] = offset
+                job["total"] = source.count()
+        return offset
+
+    # --- Background re-embedding ---
+
+    def start_reembedding(self, collection_name="documents", embedding_model=None, batch_size=64):
+        """Re-embeds a collection with a new model in a background thread.
+
+        Queries keep using the current version until the new one is complete.
+        Returns the job status dict, or the running job if one already exists.
+        """
+        embedding_model = embedding_model or self.get_embedding_model_id()
+        with _WRITE_LOCK:
+            job = _REEMBED_JOBS.get(collection_name)
+            if job and job["state"] == "running":
+                return job
+            self._begin_build(collection_name, "re-embed")
+            job = {
+                "state": "running",
+                "embedding_model": embedding_model,
+                "done": 0,
+                "total": self.get_collection_stats(collection_name)["count"],
+                "started_at": time.time(),
+                "error": None,
+            }
+            _REEMBED_JOBS[collection_name] = job
+
+        def run():
+            try:
+                self._build_new_version(collection_name, embedding_model=embedding_model,
+                                        batch_size=batch_size, job=job)
+                job["state"] = "done"
+            except Exception as e:
+                job["state"] = "failed"
+                job["error"] = str(e)
+            finally:
+                self._end_build(collection_name)
+
+        threading.Thread(target=run, name=f"reembed-{collection_name}", daemon=True).start()
+        return job
+
+    @staticmethod
+    def get_reembedding_status(collection_name="documents"):
+        return _REEMBED_JOBS.get(collection_name)
+
+    # --- Snapshots ---
+
+    def _iter_batches(self, collection, batch_size):
+        offset = 0
+        while True:
+            batch = collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=batch_size,
+                offset=offset
+            )
+            if not batch["ids"]:
+                return
+            yield batch
+            offset += len(batch["ids"])
+
+    def export_snapshot(self, path, collection_name="documents", batch_size=1000):
+        """Streams the active version of a collection to a snapshot directory."""
+        from utils.snapshot import write_snapshot
+
+        entry = self._get_entry(collection_name)
+        collection = self._get_active_collection(collection_name)
+        return write_snapshot(
+            path,
+            self._iter_batches(collection, batch_size),
+            collection_name=collection_name,
+            embedding_model=entry["embedding_model"],
+            hnsw_params=entry["hnsw"]
+        )
+
+    def import_snapshot(self, path, collection_name="documents"):
+        """Bulk-loads a snapshot as a new version of a collection, without re-embedding.
+
+        The snapshot replaces the collection's contents: it is loaded into a
+        new version, which becomes active (with the snapshot's embedding model
+        and HNSW params) only after every shard has passed its checksum.
+        """
+        from utils.snapshot import iter_snapshot, read_manifest
+
+        manifest = read_manifest(path)
+        hnsw_params = self._validate_hnsw_params({**DEFAULT_HNSW_PARAMS, **manifest["hnsw"]})
+
+        # Held for the whole import: chunks ingested meanwhile would be lost with
+        # the old version. A rebuild or re-embed already running is refused
+        # through the build registry, as they would replace the import
+        with _WRITE_LOCK:
+            self._begin_build(collection_name, "import")
+            try:
+                old_active = self._get_entry(collection_name)["active"]
+                target, version = self._create_next_version(collection_name, hnsw_params)
+                try:
+                    for batch in iter_snapshot(path, manifest):
+                        target.add(
+                            ids=batch["ids"],
+                            embeddings=batch["embeddings"],
+                            documents=batch["documents"],
+                            metadatas=batch["metadatas"]
+                        )
+                    self._activate_version(collection_name, target.name, version, manifest["embedding_model"], hnsw_params)
+                    # The document catalog and dedup index describe the old contents
+                    config = self._load_config()
+                    config[collection_name].pop("catalog", None)
+                    self._save_config(config)
+                    dedup_path = self._dedup_path(collection_name)
+                    if os.path.exists(dedup_path):
+                        os.remove(dedup_path)
+                except Exception:
+                    self.client.delete_collection(target.name)
+                    raise
+            finally:
+                self._end_build(collection_name)
+
+        if self._get_collection(old_active) is not None:
+            self.client.delete_collection(old_active)
+        return manifest
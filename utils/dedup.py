@@ -0,0 +1,207 @@
+"""Near-duplicate chunk detection with MinHash signatures and a persistent LSH index.
+
+Each chunk is reduced to a MinHash signature over its word shingles. The
+signature is split into bands, and chunks sharing any band bucket become
+candidates whose estimated Jaccard similarity is then checked against a
+threshold. Signatures and band buckets live in SQLite, so duplicates are
+detected against everything ingested before, across restarts.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    chunk_id TEXT PRIMARY KEY,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bands (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    chunk_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bands_bucket ON bands (band, bucket);
+CREATE TABLE IF NOT EXISTS links (
+    chunk_id TEXT NOT NULL,
+    source TEXT,
+    doc_id TEXT,
+    page INTEGER,
+    similarity REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_links_chunk ON links (chunk_id);
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+class NearDuplicateIndex:
+    def __init__(self, path, num_perm=128, bands=16, shingle_size=5, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands.")
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # a, b < 2**32 so a * hash + b stays within uint64 for 32-bit hashes
+        self._a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        """Opens a connection that commits on success and rolls back on error.
+
+        Connections are short-lived because Streamlit reruns a page on
+        different threads and SQLite connections are tied to their thread.
+        """
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    # --- Signatures ---
+
+    def _shingles(self, text):
+        words = _WORD_RE.findall(text.lower())
+        if len(words) <= self.shingle_size:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def signature(self, text):
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in self._shingles(text)),
+            dtype=np.uint64
+        )
+        permuted = ((hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    @staticmethod
+    def similarity(signature, other):
+        """Estimated Jaccard similarity of two signatures."""
+        return float(np.mean(signature == other))
+
+    def _buckets(self, signature):
+        for band in range(self.bands):
+            digest = hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8)
+            yield band, int.from_bytes(digest.digest(), "big", signed=True)
+
+    # --- Index ---
+
+    def find_duplicate(self, conn, signature, threshold, pending=None):
+        """Returns (chunk_id, similarity) of the most similar chunk at or above threshold, or None.
+
+        pending (a PendingSignatures) is searched as well, for chunks of the
+        current batch that are not committed to the index yet.
+        """
+        candidates = {}
+        for band, bucket in self._buckets(signature):
+            rows = conn.execute("SELECT chunk_id FROM bands WHERE band = ? AND bucket = ?", (band, bucket))
+            for (chunk_id,) in rows:
+                candidates[chunk_id] = None
+            if pending is not None:
+                for chunk_id in pending.buckets.get((band, bucket), ()):
+                    candidates[chunk_id] = pending.signatures[chunk_id]
+
+        best = None
+        for chunk_id, other in candidates.items():
+            if other is None:
+                row = conn.execute("SELECT signature FROM signatures WHERE chunk_id = ?", (chunk_id,)).fetchone()
+                if row is None:
+                    continue
+                other = np.frombuffer(row[0], dtype=np.uint32)
+            score = self.similarity(signature, other)
+            if score >= threshold and (best is None or score > best[1]):
+                best = (chunk_id, score)
+        return best
+
+    def add(self, conn, chunk_id, signature):
+        conn.execute(
+            "INSERT OR REPLACE INTO signatures (chunk_id, signature) VALUES (?, ?)",
+            (chunk_id, signature.tobytes())
+        )
+        conn.executemany(
+            "INSERT INTO bands (band, bucket, chunk_id) VALUES (?, ?, ?)",
+            [(band, bucket, chunk_id) for band, bucket in self._buckets(signature)]
+        )
+
+    def add_many(self, conn, signatures):
+        for chunk_id, signature in signatures.items():
+            self.add(conn, chunk_id, signature)
+
+    def link(self, conn, chunk_id, metadata, similarity):
+        """Records that a chunk of another document duplicates an indexed chunk."""
+        conn.execute(
+            "INSERT INTO links (chunk_id, source, doc_id, page, similarity, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (chunk_id, metadata.get("source"), metadata.get("doc_id"), metadata.get("page"), similarity, time.time())
+        )
+
+    def get_links(self, chunk_ids):
+        """Maps chunk ids to the other documents their text was also found in."""
+        if not chunk_ids:
+            return {}
+        placeholders = ",".join("?" * len(chunk_ids))
+        links = {}
+        with self.connect() as conn:
+            rows = conn.execute(
+                f"SELECT chunk_id, source, page FROM links WHERE chunk_id IN ({placeholders})",
+                list(chunk_ids)
+            )
+            for chunk_id, source, page in rows:
+                links.setdefault(chunk_id, []).append({"source": source, "page": page})
+        return links
+
+    def count(self, conn):
+        return conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    # --- Savings ---
+
+    def add_stats(self, conn, **values):
+        for key, value in values.items():
+            conn.execute(
+                "INSERT INTO stats (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                (key, value)
+            )
+
+    def get_stats(self, conn=None):
+        if conn is not None:
+            return dict(conn.execute("SELECT key, value FROM stats").fetchall())
+        with self.connect() as conn:
+            return self.get_stats(conn)
+
+
+class PendingSignatures:
+    """Signatures of a batch that is still being ingested, bucketed like the index."""
+
+    def __init__(self, index):
+        self.index = index
+        self.signatures = {}
+        self.buckets = {}
+
+    def add(self, chunk_id, signature):
+        self.signatures[chunk_id] = signature
+        for key in self.index._buckets(signature):
+            self.buckets.setdefault(key, []).append(chunk_id)
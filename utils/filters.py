@@ -0,0 +1,75 @@
+import datetime
+
+import streamlit as st
+
+
+def build_where(doc_ids=None, sources=None, file_types=None, page_range=None, since=None):
+    """Builds a Chroma `where` clause from scope filters, or None for no filtering.
+
+    page_range is an inclusive (first, last) pair of 1-based page numbers and
+    since is a date; chunks store 0-based pages and epoch seconds.
+    """
+    conditions = []
+
+    documents = []
+    if doc_ids:
+        documents.append({"doc_id": {"$in": list(doc_ids)}})
+    if sources:
+        documents.append({"source": {"$in": list(sources)}})
+    if len(documents) > 1:
+        conditions.append({"$or": documents})
+    else:
+        conditions.extend(documents)
+
+    if file_types:
+        conditions.append({"file_type": {"$in": list(file_types)}})
+    if page_range:
+        first, last = page_range
+        if first:
+            conditions.append({"page": {"$gte": int(first) - 1}})
+        if last:
+            conditions.append({"page": {"$lte": int(last) - 1}})
+    if since:
+        since_ts = datetime.datetime.combine(since, datetime.time.min).timestamp()
+        conditions.append({"ingested_at": {"$gte": int(since_ts)}})
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+def scope_filter_ui(db_manager, key="scope"):
+    """Renders document/page/type/date scope widgets and returns the matching `where` clause."""
+    documents = {d["key"]: d for d in db_manager.list_documents()}
+
+    selected_keys = st.multiselect(
+        "Documents",
+        list(documents),
+        format_func=lambda k: f"{documents[k]['source']} ({documents[k]['chunks']} chunks)",
+        key=f"{key}_documents",
+        help="Leave empty to search every document."
+    )
+    selected = [documents[k] for k in selected_keys if k in documents]
+    file_types = sorted({d["file_type"] for d in documents.values() if d.get("file_type")})
+    selected_types = st.multiselect("File types", file_types, key=f"{key}_file_types")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        first_page = st.number_input("From page", min_value=0, value=0, key=f"{key}_first_page", help="0 = no limit")
+    with col2:
+        last_page = st.number_input("To page", min_value=0, value=0, key=f"{key}_last_page", help="0 = no limit")
+
+    use_since = st.checkbox("Only recently ingested", key=f"{key}_use_since")
+    since = None
+    if use_since:
+        since = st.date_input("Ingested since", value=datetime.date.today(), key=f"{key}_since")
+
+    return build_where(
+        doc_ids=[d["doc_id"] for d in selected if d.get("doc_id")],
+        sources=[d["source"] for d in selected if not d.get("doc_id")],
+        file_types=selected_types,
+        page_range=(first_page, last_page),
+        since=since
+    )
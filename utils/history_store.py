@@ -0,0 +1,253 @@
+"""Persistent chat history in SQLite.
+
+Conversations and their messages are appended one turn at a time, so a
+conversation survives page reloads and new sessions, and pages only read
+the slice they show. Messages are indexed by conversation and time, and
+by an FTS5 full-text index when SQLite provides it (falling back to LIKE).
+
+Usage:
+    python -m utils.history_store export history.jsonl
+    python -m utils.history_store export history.json --format json
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+EXPORT_FORMATS = ["jsonl", "json"]
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations (updated_at);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL REFERENCES conversations (id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id, created_at);
+"""
+
+# External-content FTS table kept in sync with messages by triggers
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+    content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+"""
+
+
+class ChatHistoryStore:
+    def __init__(self, path="./data/chat_history.db"):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.connect() as conn:
+            conn.executescript(_SCHEMA)
+            try:
+                conn.executescript(_FTS_SCHEMA)
+                self.full_text = True
+            except sqlite3.OperationalError:
+                # SQLite built without FTS5
+                self.full_text = False
+
+    @contextmanager
+    def connect(self):
+        """Opens a short-lived connection that commits on success and rolls back on error."""
+        conn = sqlite3.connect(self.path, timeout=60)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    # --- Writes ---
+
+    def create_conversation(self, title=None):
+        conversation_id = uuid.uuid4().hex
+        now = time.time()
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT INTO conversations (id, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (conversation_id, title, now, now)
+            )
+        return conversation_id
+
+    def append_message(self, conversation_id, role, content):
+        """Appends one message; the first user message also becomes the conversation title."""
+        now = time.time()
+        with self.connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO messages (conversation_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                (conversation_id, role, content, now)
+            )
+            conn.execute(
+                "UPDATE conversations SET updated_at = ?, message_count = message_count + 1, "
+                "title = COALESCE(title, CASE WHEN ? = 'user' THEN ? END) WHERE id = ?",
+                (now, role, content[:80], conversation_id)
+            )
+            return cursor.lastrowid
+
+    def delete_conversation(self, conversation_id):
+        with self.connect() as conn:
+            conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+            conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+    # --- Reads ---
+
+    def get_conversation(self, conversation_id):
+        with self.connect() as conn:
+            row = conn.execute("SELECT * FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        return dict(row) if row else None
+
+    def count_conversations(self):
+        with self.connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+    def list_conversations(self, limit=20, offset=0):
+        """One page of conversations, most recently updated first."""
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM conversations ORDER BY updated_at DESC, id LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_messages(self, conversation_id, limit=None):
+        """Messages of a conversation in order; with limit, only the most recent ones."""
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT id, role, content, created_at FROM messages WHERE conversation_id = ? "
+                "ORDER BY created_at DESC, id DESC LIMIT ?",
+                (conversation_id, -1 if limit is None else limit)
+            ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def search(self, query, limit=20, offset=0):
+        """Full-text search over every message; returns matches with a highlighted snippet."""
+        words = _WORD_RE.findall(query)
+        if not words:
+            return []
+        with self.connect() as conn:
+            if self.full_text:
+                match = " ".join('"' + word.replace('"', '""') + '"' for word in words)
+                rows = conn.execute(
+                    "SELECT m.id, m.conversation_id, m.role, m.created_at, c.title, "
+                    "snippet(messages_fts, 0, '**', '**', '…', 16) AS snippet "
+                    "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+                    "JOIN conversations c ON c.id = m.conversation_id "
+                    "WHERE messages_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+                    (match, limit, offset)
+                ).fetchall()
+            else:
+                conditions = " AND ".join("m.content LIKE ?" for _ in words)
+                rows = conn.execute(
+                    "SELECT m.id, m.conversation_id, m.role, m.created_at, c.title, "
+                    "substr(m.content, 1, 200) AS snippet "
+                    f"FROM messages m JOIN conversations c ON c.id = m.conversation_id WHERE {conditions} "
+                    "ORDER BY m.created_at DESC LIMIT ? OFFSET ?",
+                    [f"%{word}%" for word in words] + [limit, offset]
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    # --- Export ---
+
+    def iter_export(self, fmt="jsonl", conversation_ids=None, batch_size=500):
+        """Yields the export as text chunks, reading messages in batches.
+
+        jsonl writes one message per line; json writes a list of
+        conversations with their messages. Memory use stays flat however
+        long the history is.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Invalid export format '{fmt}'. Use one of {EXPORT_FORMATS}.")
+
+        with self.connect() as conn:
+            if conversation_ids is None:
+                conversations = conn.execute("SELECT * FROM conversations ORDER BY created_at, id").fetchall()
+            else:
+                placeholders = ",".join("?" * len(conversation_ids))
+                conversations = conn.execute(
+                    f"SELECT * FROM conversations WHERE id IN ({placeholders}) ORDER BY created_at, id",
+                    list(conversation_ids)
+                ).fetchall()
+
+            if fmt == "json":
+                yield "["
+            for i, conversation in enumerate(conversations):
+                if fmt == "json":
+                    header = json.dumps({
+                        "id": conversation["id"],
+                        "title": conversation["title"],
+                        "created_at": conversation["created_at"],
+                    }, ensure_ascii=False)
+                    yield ("," if i else "") + "\n" + header[:-1] + ', "messages": ['
+
+                cursor = conn.execute(
+                    "SELECT role, content, created_at FROM messages WHERE conversation_id = ? ORDER BY created_at, id",
+                    (conversation["id"],)
+                )
+                first = True
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        message = dict(row)
+                        if fmt == "jsonl":
+                            message = {"conversation_id": conversation["id"], "title": conversation["title"], **message}
+                            yield json.dumps(message, ensure_ascii=False) + "\n"
+                        else:
+                            yield ("" if first else ", ") + json.dumps(message, ensure_ascii=False)
+                        first = False
+
+                if fmt == "json":
+                    yield "]}"
+            if fmt == "json":
+                yield "\n]\n"
+
+    def export(self, file, fmt="jsonl", conversation_ids=None):
+        """Writes the export to a binary file object as it is generated."""
+        for chunk in self.iter_export(fmt, conversation_ids):
+            file.write(chunk.encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the persistent chat history.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Write every conversation to a file.")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--format", choices=EXPORT_FORMATS, default="jsonl")
+    export_parser.add_argument("--db", default="./data/chat_history.db")
+    args = parser.parse_args()
+
+    store = ChatHistoryStore(args.db)
+    with open(args.path, "wb") as f:
+        store.export(f, args.format)
+    print(f"Exported {store.count_conversations()} conversations to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""Sweeps HNSW parameters over the stored corpus and reports recall@k and latency.
+
+Ground truth comes from an exact brute-force search over the stored
+embeddings, so the numbers reflect our own data rather than a benchmark set.
+The corpus is streamed in blocks (never held in memory at once), and one
+index is built per (M, construction_ef) pair and searched with every
+search_ef, as search_ef does not change the graph.
+
+Usage:
+    python -m utils.hnsw_sweep --collection documents --k 5 \
+        --M 8 16 32 --construction-ef 100 200 --search-ef 10 50 100
+"""
+import argparse
+import itertools
+import shutil
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+import pandas as pd
+
+from utils.db_manager import DBManager, HNSW_SPACES
+
+
+def iter_corpus(collection, batch_size=1000):
+    """Yields (ids, embeddings) blocks of the stored vectors."""
+    offset = 0
+    while True:
+        batch = collection.get(include=["embeddings"], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            break
+        yield batch["ids"], np.asarray(batch["embeddings"], dtype=np.float32)
+        offset += len(batch["ids"])
+
+
+def list_ids(collection, batch_size=10000):
+    ids = []
+    offset = 0
+    while True:
+        batch = collection.get(include=[], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            break
+        ids.extend(batch["ids"])
+        offset += len(batch["ids"])
+    return ids
+
+
+def _normalize(vectors):
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def _distances(queries, block, space):
+    """Distances from each query to each block vector, as Chroma defines them."""
+    if space == "cosine":
+        return 1.0 - queries @ _normalize(block).T
+    if space == "ip":
+        return 1.0 - queries @ block.T
+    return (queries ** 2).sum(axis=1, keepdims=True) - 2.0 * queries @ block.T + (block ** 2).sum(axis=1)
+
+
+def exact_search(blocks, queries, k, space):
+    """Brute-force top-k ids per query over (ids, embeddings) blocks, nearest first.
+
+    Only one queries x block distance matrix and the running top-k of each
+    query are kept in memory.
+    """
+    if space == "cosine":
+        queries = _normalize(queries)
+    best_distances = np.empty((len(queries), 0), dtype=np.float32)
+    best_ids = np.empty((len(queries), 0), dtype=object)
+    for ids, block in blocks:
+        distances = np.hstack([best_distances, _distances(queries, block, space)])
+        candidates = np.hstack([best_ids, np.broadcast_to(np.array(ids, dtype=object), (len(queries), len(ids)))])
+        keep = min(k, distances.shape[1])
+        top = np.argpartition(distances, keep - 1, axis=1)[:, :keep]
+        best_distances = np.take_along_axis(distances, top, axis=1)
+        best_ids = np.take_along_axis(candidates, top, axis=1)
+    order = best_distances.argsort(axis=1)
+    return np.take_along_axis(best_ids, order, axis=1).tolist()
+
+
+def run_sweep(collection, queries, query_ids, k, space, builds, search_efs, batch_size=1000):
+    """Builds one index per (M, construction_ef) in builds and measures every search_ef on it.
+
+    query_ids holds the stored id of each sampled query (or None for external
+    queries) so that a query never counts as its own neighbour.
+    """
+    truth = []
+    for query_id, neighbours in zip(query_ids, exact_search(iter_corpus(collection, batch_size), queries, k + 1, space)):
+        truth.append(set([i for i in neighbours if i != query_id][:k]))
+
+    name = "hnsw_sweep"
+    results = []
+    for M, construction_ef in builds:
+        # A persistent client so that search_ef changes take effect on reopening,
+        # which reloads the index rather than rebuilding it
+        directory = tempfile.mkdtemp(prefix="hnsw_sweep_")
+        try:
+            client = chromadb.PersistentClient(path=directory)
+            params = {"space": space, "M": M, "construction_ef": construction_ef, "search_ef": search_efs[0]}
+            index = client.create_collection(name, metadata=DBManager._hnsw_metadata(params))
+            start = time.perf_counter()
+            for ids, block in iter_corpus(collection, batch_size):
+                index.add(ids=ids, embeddings=block)
+            build_time = time.perf_counter() - start
+
+            for search_ef in search_efs:
+                client.get_collection(name).modify(configuration={"hnsw": {"ef_search": search_ef}})
+                client.close()
+                client = chromadb.PersistentClient(path=directory)
+                index = client.get_collection(name)
+                # The first query loads the index from disk
+                index.query(query_embeddings=queries[:1], n_results=1, include=[])
+
+                latencies, recalls = [], []
+                for query, query_id, expected in zip(queries, query_ids, truth):
+                    start = time.perf_counter()
+                    found = index.query(query_embeddings=[query.tolist()], n_results=k + 1, include=[])
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    neighbours = [i for i in found["ids"][0] if i != query_id][:k]
+                    recalls.append(len(expected.intersection(neighbours)) / max(len(expected), 1))
+
+                results.append({
+                    **params,
+                    "search_ef": search_ef,
+                    f"recall@{k}": float(np.mean(recalls)),
+                    "p50_ms": float(np.percentile(latencies, 50)),
+                    "p95_ms": float(np.percentile(latencies, 95)),
+                    "build_s": build_time,
+                })
+            client.close()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return pd.DataFrame(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HNSW accuracy/latency sweep over a stored collection.")
+    parser.add_argument("--collection", default="documents")
+    parser.add_argument("--persist-directory", default="./data/chroma_db")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--num-queries", type=int, default=200,
+                        help="Stored chunks sampled as queries when --queries is not given.")
+    parser.add_argument("--queries", help="Text file with one query per line, embedded with the collection's model.")
+    parser.add_argument("--space", choices=HNSW_SPACES, help="Defaults to the collection's configured space.")
+    parser.add_argument("--M", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--batch-size", type=int, default=1000, help="Vectors read per block from the collection.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Optional CSV file for the results.")
+    args = parser.parse_args()
+
+    db_manager = DBManager(persist_directory=args.persist_directory)
+    # The logical name maps to the active version (documents__vN after a rebuild or re-embed)
+    collection = db_manager._get_active_collection(args.collection)
+    count = collection.count()
+    if not count:
+        raise SystemExit(f"Collection '{args.collection}' is empty.")
+
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        # Queries must be embedded like the stored vectors: same model, query mode
+        embedding = db_manager.get_embedding_function(db_manager.get_collection_embedding_model(args.collection))
+        embeddings = [embedding.embed_query(text) for text in texts]
+        queries = np.asarray(embeddings, dtype=np.float32)
+        query_ids = [None] * len(texts)
+    else:
+        ids = list_ids(collection)
+        rng = np.random.default_rng(args.seed)
+        query_ids = [ids[row] for row in rng.choice(len(ids), size=min(args.num_queries, len(ids)), replace=False)]
+        sampled = collection.get(ids=query_ids, include=["embeddings"])
+        by_id = dict(zip(sampled["ids"], sampled["embeddings"]))
+        queries = np.asarray([by_id[i] for i in query_ids], dtype=np.float32)
+
+    space = args.space or db_manager.get_hnsw_params(args.collection)["space"]
+    builds = list(itertools.product(args.M, args.construction_ef))
+    print(f"Sweeping {len(builds) * len(args.search_ef)} configurations ({len(builds)} index builds) "
+          f"over {count} vectors with {len(queries)} queries...")
+
+    df = run_sweep(collection, queries, query_ids, args.k, space, builds, args.search_ef, args.batch_size)
+    df = df.sort_values(["p95_ms"])
+    print(df.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    if args.output:
+        df.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
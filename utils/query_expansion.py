@@ -0,0 +1,74 @@
+"""Query variants for multi-query retrieval.
+
+A question phrased differently from the text that answers it can miss
+relevant chunks. Searching a few rewrites of it (cheap rule-based ones, or
+ones written by the LLM in a single call) and fusing the results recovers
+many of them.
+"""
+import os
+import re
+
+MULTI_QUERY_MODES = ["off", "rules", "llm"]
+DEFAULT_MAX_VARIANTS = 3
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Documents are mostly Spanish or English, so both stopword lists are used
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "could", "do", "does", "for",
+    "from", "how", "i", "in", "is", "it", "me", "of", "on", "or", "should", "tell", "that",
+    "the", "this", "to", "was", "what", "when", "where", "which", "who", "why", "with",
+    "would", "you", "about", "please", "there",
+    "al", "como", "cómo", "con", "cual", "cuál", "cuales", "cuáles", "cuando", "cuándo",
+    "de", "del", "donde", "dónde", "el", "en", "es", "esta", "este", "hay", "la", "las",
+    "lo", "los", "me", "para", "por", "que", "qué", "quien", "quién", "se", "son", "su",
+    "sobre", "un", "una", "y", "dime", "puedes", "explica",
+}
+
+# Leading phrases that turn a statement into a question
+_QUESTION_PREFIX_RE = re.compile(
+    r"^\s*(what|which|who|how|why|when|where)\s+(is|are|was|were|does|do|did|can)\s+(the\s+)?"
+    r"|^\s*(qué|que|cuál|cual|cuáles|cuales|cómo|como|por qué|quién|quien)\s+(es|son|significa|hace)?\s*(el|la|los|las)?\s*",
+    re.IGNORECASE
+)
+
+_LLM_PROMPT = (
+    "Rewrite the following question in {count} different ways to help search a document "
+    "collection. Keep the original language, use different wording or likely synonyms, and "
+    "write one rewrite per line with no numbering or extra text.\n\nQuestion: {question}"
+)
+
+
+def get_multi_query_mode():
+    mode = os.getenv("MULTI_QUERY", "off")
+    return mode if mode in MULTI_QUERY_MODES else "off"
+
+
+def _unique(queries, max_variants):
+    seen = set()
+    unique = []
+    for query in queries:
+        normalized = " ".join(query.lower().split())
+        if normalized and normalized not in seen:
+            seen.add(normalized)
+            unique.append(query.strip())
+    return unique[:max_variants]
+
+
+def expand_query(question, max_variants=DEFAULT_MAX_VARIANTS):
+    """Rule-based variants: the question, its keywords, and its subject as a statement."""
+    words = _WORD_RE.findall(question)
+    keywords = " ".join(w for w in words if w.lower() not in _STOPWORDS)
+    statement = _QUESTION_PREFIX_RE.sub("", question.strip().lstrip("¿")).strip().rstrip("?").strip()
+    return _unique([question, keywords, statement], max_variants)
+
+
+def llm_query_variants(llm, question, max_variants=DEFAULT_MAX_VARIANTS):
+    """Asks the LLM for rewrites in one call; falls back to the rule-based variants on failure."""
+    try:
+        response = llm.invoke(_LLM_PROMPT.format(count=max_variants - 1, question=question))
+        text = getattr(response, "content", response)
+        rewrites = [re.sub(r"^\s*(\d+[.)]|[-*•])\s*", "", line) for line in str(text).splitlines()]
+    except Exception:
+        return expand_query(question, max_variants)
+    return _unique([question] + rewrites, max_variants)
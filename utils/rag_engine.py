@@ -1,66 +1,213 @@
+import hashlib
 import os
 import tempfile
+import time
+import uuid
+from datetime import datetime
 from typing import List
 import warnings
 
 # Suppress LangChain deprecation warnings
 warnings.filterwarnings('ignore', category=DeprecationWarning, module='langchain')
 
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_ollama import ChatOllama
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
 from utils.db_manager import DBManager
 
+# LangChain loaders, chains and provider SDKs are imported inside the methods
+# that need them, so constructing the engine (and loading a page) stays cheap
+# and only the selected provider's SDK is ever imported.
+
 class RAGEngine:
     def __init__(self):
         self.db_manager = DBManager()
-        self.vector_store = self.db_manager.get_vector_store()
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
+        self._text_splitter = None
+        self.last_ingest_report = None
+
+    @property
+    def text_splitter(self):
+        if self._text_splitter is None:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            self._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=1000,
+                chunk_overlap=200,
+                # Lets the context packer merge neighbouring chunks exactly
+                add_start_index=True
+            )
+        return self._text_splitter
+
+    @property
+    def vector_store(self):
+        # Resolved on every access so a re-embedded collection is picked up after its switch
+        return self.db_manager.get_vector_store()
 
     def ingest_file(self, uploaded_file):
         """Ingests a file (PDF or TXT) into the vector database."""
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
+        content = uploaded_file.getvalue()
+        file_type = uploaded_file.name.split('.')[-1].lower()
+        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_type}") as tmp_file:
+            tmp_file.write(content)
             tmp_path = tmp_file.name
 
         try:
             if uploaded_file.name.endswith(".pdf"):
+                from langchain_community.document_loaders import PyPDFLoader
                 loader = PyPDFLoader(tmp_path)
             else:
+                from langchain_community.document_loaders import TextLoader
                 loader = TextLoader(tmp_path)
             
             documents = loader.load()
             chunks = self.text_splitter.split_documents(documents)
             
-            # Add metadata
+            # Add metadata (indexed by Chroma, so it can scope retrieval)
+            ingested_at = int(time.time())
+            doc_id = hashlib.sha256(content).hexdigest()[:16]
             for chunk in chunks:
                 chunk.metadata["source"] = uploaded_file.name
+                chunk.metadata["doc_id"] = doc_id
+                chunk.metadata["file_type"] = file_type
+                chunk.metadata["page"] = int(chunk.metadata.get("page", 0))
+                chunk.metadata["ingested_at"] = ingested_at
+                chunk.metadata["ingest_date"] = datetime.fromtimestamp(ingested_at).strftime("%Y-%m-%d")
             
-            self.vector_store.add_documents(chunks)
-            return len(chunks)
+            return self._add_chunks(chunks)
         finally:
             os.remove(tmp_path)
 
+    def _add_chunks(self, chunks):
+        """Embeds and stores chunks, reusing work for near-duplicates of already indexed text.
+
+        A near-duplicate of a chunk of the same document (a re-upload, a
+        repeated header) is skipped. One of another document is still stored
+        under its own doc_id/source, so scope filters keep finding it, but
+        with the matched chunk's vector instead of being embedded again.
+        DEDUP_MODE selects "skip" (default), "link" (also record which
+        document the duplicate came from) or "off". What was saved is kept in
+        last_ingest_report and accumulated in the dedup index stats.
+        Returns the number of chunks stored (embedded or reusing a vector);
+        how many were embedded is in last_ingest_report.
+        """
+        from utils.dedup import PendingSignatures
+
+        mode = os.getenv("DEDUP_MODE", "skip")
+        threshold = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+        ids = [str(uuid.uuid4()) for _ in chunks]
+        for chunk, chunk_id in zip(chunks, ids):
+            chunk.metadata["chunk_id"] = chunk_id
+
+        report = {"mode": mode, "chunks": len(chunks), "stored": len(chunks), "embedded": len(chunks), "duplicates": 0, "reused": 0,
+                  "embed_seconds": 0.0, "embed_seconds_saved": 0.0, "bytes_saved": 0}
+
+        if mode == "off":
+            start = time.perf_counter()
+            self.db_manager.add_documents(chunks, ids=ids)
+            report["embed_seconds"] = time.perf_counter() - start
+            self.last_ingest_report = report
+            return len(chunks)
+
+        # Matching only reads the index; nothing is written until the chunks are stored
+        index = self.db_manager.get_dedup_index()
+        pending = PendingSignatures(index)
+        matches = []
+        with index.connect() as conn:
+            for chunk, chunk_id in zip(chunks, ids):
+                signature = index.signature(chunk.page_content)
+                match = index.find_duplicate(conn, signature, threshold, pending)
+                if match is None:
+                    pending.add(chunk_id, signature)
+                matches.append(match)
+
+        stored = self.db_manager.get_chunks({m[0] for m in matches if m and m[0] not in pending.signatures})
+        kept, kept_ids, skipped, reused, reused_ids, reused_vectors, links = [], [], [], [], [], [], []
+        for chunk, chunk_id, match in zip(chunks, ids, matches):
+            if match is None or (match[0] not in pending.signatures and match[0] not in stored):
+                # New text, or the matched chunk is gone from the collection
+                if match is not None:
+                    pending.add(chunk_id, index.signature(chunk.page_content))
+                kept.append(chunk)
+                kept_ids.append(chunk_id)
+                continue
+            if match[0] in pending.signatures or stored[match[0]][0].get("doc_id") == chunk.metadata["doc_id"]:
+                skipped.append(chunk)
+            else:
+                reused.append(chunk)
+                reused_ids.append(chunk_id)
+                reused_vectors.append(stored[match[0]][1])
+                if mode == "link":
+                    links.append((match[0], chunk.metadata, match[1]))
+
+        start = time.perf_counter()
+        if kept:
+            self.db_manager.add_documents(kept, ids=kept_ids)
+        embed_seconds = time.perf_counter() - start
+        if reused:
+            self.db_manager.add_documents(reused, ids=reused_ids, embeddings=reused_vectors)
+
+        # Short write transaction, so concurrent uploads never wait on an embedding run
+        with index.connect() as conn:
+            index.add_many(conn, pending.signatures)
+            for link in links:
+                index.link(conn, *link)
+            if kept:
+                index.add_stats(conn, embedded_chunks=len(kept), embed_seconds=embed_seconds)
+            # Savings are estimated from the average embedding time per chunk so far
+            totals = index.get_stats(conn)
+            seconds_per_chunk = totals.get("embed_seconds", 0.0) / totals["embedded_chunks"] if totals.get("embedded_chunks") else 0.0
+            dimension = self.db_manager.get_embedding_dimension() or 0
+            duplicates = len(skipped) + len(reused)
+            report.update({
+                "stored": len(kept) + len(reused),
+                "embedded": len(kept),
+                "duplicates": duplicates,
+                "reused": len(reused),
+                "embed_seconds": embed_seconds,
+                "embed_seconds_saved": seconds_per_chunk * duplicates,
+                "bytes_saved": sum(len(c.page_content.encode("utf-8")) + dimension * 4 for c in skipped),
+            })
+            index.add_stats(
+                conn,
+                duplicates=report["duplicates"],
+                embed_seconds_saved=report["embed_seconds_saved"],
+                bytes_saved=report["bytes_saved"]
+            )
+
+        self.last_ingest_report = report
+        return report["stored"]
+
     def get_llm(self, model_provider, model_name, temperature=0.7):
         if model_provider == "Gemini":
             api_key = os.getenv("GOOGLE_API_KEY")
             if not api_key:
                 raise ValueError("Google API Key not found.")
+            from langchain_google_genai import ChatGoogleGenerativeAI
             return ChatGoogleGenerativeAI(model=model_name, google_api_key=api_key, temperature=temperature)
         elif model_provider == "Ollama":
+            from langchain_ollama import ChatOllama
             return ChatOllama(model=model_name, temperature=temperature)
         else:
             raise ValueError("Invalid model provider")
 
-    def get_chain(self, model_provider="Gemini", model_name="gemini-2.5-flash", temperature=0.7):
+    def get_chain(self, model_provider="Gemini", model_name="gemini-2.5-flash", temperature=0.7, where=None,
+                  token_budget=None, fetch_k=8, multi_query=None):
+        from langchain.chains import ConversationalRetrievalChain
+        from langchain.memory import ConversationBufferMemory
+        from utils.context_packer import get_token_budget
+        from utils.query_expansion import expand_query, get_multi_query_mode, llm_query_variants
+        from utils.retrievers import PackedRetriever
+
         llm = self.get_llm(model_provider, model_name, temperature)
-        retriever = self.vector_store.as_retriever(search_kwargs={"k": 5})
+
+        multi_query = multi_query or get_multi_query_mode()
+        query_variants = None
+        if multi_query == "rules":
+            query_variants = expand_query
+        elif multi_query == "llm":
+            query_variants = lambda question: llm_query_variants(llm, question)
+
+        # Fetch a few extra candidates; packing merges overlaps and trims to the budget
+        retriever = PackedRetriever(
+            base_retriever=self.db_manager.get_retriever(k=fetch_k, where=where, query_variants=query_variants),
+            token_budget=token_budget or get_token_budget(model_provider)
+        )
         
         memory = ConversationBufferMemory(
             memory_key="chat_history",
@@ -0,0 +1,121 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from utils.context_packer import pack_context
+
+
+class VectorSearchRetriever(BaseRetriever):
+    """Embeds the query once and hands the vector to a search function.
+
+    search_by_vector(vector, k) must return a list of Documents, which lets
+    DBManager plug in backends that are not LangChain vector stores.
+    """
+
+    embedding_function: Any
+    search_by_vector: Any
+    k: int = 5
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector = self.embedding_function.embed_query(query)
+        return self.search_by_vector(vector, self.k)
+
+
+class PackedRetriever(BaseRetriever):
+    """Wraps a retriever and merges/packs its results into a token budget.
+
+    The report of the last query (chunk and token counts before and after
+    packing) is kept in last_report.
+    """
+
+    base_retriever: Any
+    token_budget: int
+    last_report: Optional[dict] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        documents = self.base_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        packed, self.last_report = pack_context(documents, self.token_budget)
+        return packed
+
+
+# Shared by every FanOutRetriever so concurrent searches reuse warm threads
+_SEARCH_POOL = None
+_SEARCH_POOL_LOCK = threading.Lock()
+
+# Reciprocal rank fusion constant (Cormack et al.); damps the weight of top ranks
+RRF_K = 60
+
+
+def _search_pool():
+    global _SEARCH_POOL
+    with _SEARCH_POOL_LOCK:
+        if _SEARCH_POOL is None:
+            _SEARCH_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="fanout-search")
+    return _SEARCH_POOL
+
+
+def _document_key(document):
+    metadata = document.metadata
+    if metadata.get("chunk_id"):
+        return metadata["chunk_id"]
+    return metadata.get("source"), metadata.get("page"), metadata.get("start_index"), document.page_content
+
+
+class FanOutRetriever(BaseRetriever):
+    """Searches several variants of the query at once and fuses the results.
+
+    query_variants(question) returns the queries to run (the question
+    itself first). They are embedded in one batch with embed_queries and
+    searched concurrently on a thread pool, so the added wall-clock time is
+    roughly that of the slowest single search. Results are deduplicated and
+    ranked by reciprocal rank fusion.
+    """
+
+    embed_queries: Any
+    search_by_vector: Any
+    query_variants: Any
+    k: int = 5
+    last_report: Optional[dict] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        start = time.perf_counter()
+        queries = self.query_variants(query)
+        vectors = self.embed_queries(queries)
+        embedded = time.perf_counter()
+
+        def timed_search(vector):
+            search_start = time.perf_counter()
+            results = self.search_by_vector(vector, self.k)
+            return results, time.perf_counter() - search_start
+
+        searches = list(_search_pool().map(timed_search, vectors))
+        searched = time.perf_counter()
+
+        scores = {}
+        documents = {}
+        for results, _ in searches:
+            for rank, document in enumerate(results):
+                key = _document_key(document)
+                documents.setdefault(key, document)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+
+        fused = sorted(scores, key=scores.get, reverse=True)[:self.k]
+        self.last_report = {
+            "queries": queries,
+            "candidates": len(documents),
+            "embed_seconds": embedded - start,
+            "search_seconds": searched - embedded,
+            "slowest_search_seconds": max((seconds for _, seconds in searches), default=0.0),
+        }
+        return [documents[key] for key in fused]
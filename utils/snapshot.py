@@ -0,0 +1,147 @@
+"""Portable snapshots of a vector collection.
+
+A snapshot is a directory of shards plus a manifest:
+
+    manifest.json                 collection, embedding model, HNSW params, shard list
+    shard-00000.embeddings.npy    float32 matrix, one row per chunk
+    shard-00000.columns.json      {"ids": [...], "documents": [...], "metadatas": [...]}
+    ...
+
+Every shard file carries a SHA-256 checksum in the manifest, which is
+written last, so an interrupted export never looks complete.
+
+Usage:
+    python -m utils.snapshot export ./snapshots/2024-06-01
+    python -m utils.snapshot import ./snapshots/2024-06-01
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+SNAPSHOT_FORMAT = "documentos-rag-snapshot"
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+
+def sha256_file(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_snapshot(path, batches, collection_name, embedding_model, hnsw_params):
+    """Writes an iterable of Chroma get() batches to a snapshot directory.
+
+    Only one batch is held in memory at a time. Returns the manifest.
+    """
+    os.makedirs(path, exist_ok=True)
+    if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        raise ValueError(f"A snapshot already exists at '{path}'.")
+
+    shards = []
+    count = 0
+    dim = None
+    for batch in batches:
+        name = f"shard-{len(shards):05d}"
+        files = {
+            "embeddings": f"{name}.embeddings.npy",
+            "columns": f"{name}.columns.json",
+        }
+        embeddings = np.asarray(batch["embeddings"], dtype=np.float32)
+        dim = embeddings.shape[1]
+        np.save(os.path.join(path, files["embeddings"]), embeddings)
+        with open(os.path.join(path, files["columns"]), "w", encoding="utf-8") as f:
+            json.dump({
+                "ids": batch["ids"],
+                "documents": batch["documents"],
+                "metadatas": batch["metadatas"],
+            }, f, ensure_ascii=False)
+
+        shards.append({
+            "name": name,
+            "count": len(batch["ids"]),
+            "files": files,
+            "sha256": {key: sha256_file(os.path.join(path, file)) for key, file in files.items()},
+        })
+        count += len(batch["ids"])
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "collection": collection_name,
+        "embedding_model": embedding_model,
+        "hnsw": hnsw_params,
+        "count": count,
+        "dim": dim,
+        "created_at": time.time(),
+        "shards": shards,
+    }
+    with open(os.path.join(path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(path):
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise ValueError(f"No snapshot manifest found at '{path}'.")
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"'{path}' is not a {SNAPSHOT_FORMAT}.")
+    if manifest.get("format_version", 0) > SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Snapshot format version {manifest['format_version']} is newer than this app supports.")
+    return manifest
+
+
+def iter_snapshot(path, manifest=None):
+    """Yields one batch per shard, verifying each shard's checksums before loading it."""
+    manifest = manifest or read_manifest(path)
+    for shard in manifest["shards"]:
+        for key, file in shard["files"].items():
+            if sha256_file(os.path.join(path, file)) != shard["sha256"][key]:
+                raise ValueError(f"Checksum mismatch in snapshot file '{file}'.")
+
+        with open(os.path.join(path, shard["files"]["columns"]), "r", encoding="utf-8") as f:
+            columns = json.load(f)
+        embeddings = np.load(os.path.join(path, shard["files"]["embeddings"]))
+        if len(columns["ids"]) != shard["count"] or embeddings.shape[0] != shard["count"]:
+            raise ValueError(f"Snapshot shard '{shard['name']}' is incomplete.")
+        yield {
+            "ids": columns["ids"],
+            "embeddings": embeddings,
+            "documents": columns["documents"],
+            "metadatas": columns["metadatas"],
+        }
+
+
+def main():
+    from utils.db_manager import DBManager
+
+    parser = argparse.ArgumentParser(description="Export or import a vector collection snapshot.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="Snapshot directory")
+    parser.add_argument("--collection", default="documents")
+    parser.add_argument("--persist-directory", default="./data/chroma_db")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db_manager = DBManager(persist_directory=args.persist_directory)
+    start = time.perf_counter()
+    if args.command == "export":
+        manifest = db_manager.export_snapshot(args.path, args.collection, batch_size=args.batch_size)
+        print(f"Exported {manifest['count']} chunks ({manifest['embedding_model']}) to {args.path}")
+    else:
+        manifest = db_manager.import_snapshot(args.path, args.collection)
+        print(f"Imported {manifest['count']} chunks ({manifest['embedding_model']}) into '{args.collection}'")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Cold-start benchmark for main.py and every page.
+
+Each script's top-level imports are executed in a fresh interpreter, timing
+them and recording peak RSS and which heavy modules (ML runtimes, vector
+database, LangChain integrations) got loaded. Those should only be imported
+on first use, so the benchmark fails if a script exceeds its time budget or
+pulls one of them in at import time.
+
+With --render, each script is also run once through Streamlit's AppTest to
+time a full first render (including anything the page builds on load).
+
+Usage:
+    python -m utils.startup_bench
+    python -m utils.startup_bench --budget 1.5 --render
+"""
+import argparse
+import ast
+import glob
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = [
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "chromadb",
+    "langchain",
+    "langchain_community",
+    "langchain_chroma",
+    "langchain_google_genai",
+    "langchain_huggingface",
+    "langchain_ollama",
+]
+
+_IMPORT_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+try:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss_kb / (1024 * 1024) if sys.platform == "darwin" else rss_kb / 1024
+except ImportError:
+    rss_mb = None
+heavy = sorted(m for m in {heavy!r} if m in sys.modules)
+print(json.dumps({{"seconds": elapsed, "rss_mb": rss_mb, "heavy": heavy}}))
+"""
+
+_RENDER_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+app = AppTest.from_file({script!r}, default_timeout={timeout})
+app.run()
+print(json.dumps({{"seconds": time.perf_counter() - start, "errors": [str(e.value) for e in app.exception]}}))
+"""
+
+
+def list_scripts():
+    return [os.path.join(ROOT, "main.py")] + sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+
+
+def top_level_imports(script):
+    with open(script, "r", encoding="utf-8") as f:
+        source = f.read()
+    tree = ast.parse(source)
+    return [
+        ast.get_source_segment(source, node)
+        for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    ]
+
+
+def _run_probe(code):
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_imports(script, repeat=3):
+    code = _IMPORT_PROBE.format(root=ROOT, imports="\n".join(top_level_imports(script)), heavy=HEAVY_MODULES)
+    runs = [_run_probe(code) for _ in range(repeat)]
+    return min(runs, key=lambda r: r["seconds"])
+
+
+def measure_render(script, timeout=120):
+    return _run_probe(_RENDER_PROBE.format(root=ROOT, script=script, timeout=timeout))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure and guard cold-start time of the app and its pages.")
+    parser.add_argument("--budget", type=float, default=2.0, help="Max import seconds per script.")
+    parser.add_argument("--repeat", type=int, default=3, help="Cold runs per script (best is reported).")
+    parser.add_argument("--render", action="store_true", help="Also time a full first render with AppTest.")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'script':<28} {'import s':>9} {'rss MB':>8} {'render s':>9}  heavy modules")
+    for script in list_scripts():
+        name = os.path.relpath(script, ROOT)
+        try:
+            result = measure_imports(script, repeat=args.repeat)
+        except RuntimeError as e:
+            failures.append(f"{name}: import failed ({e})")
+            continue
+
+        render = ""
+        if args.render:
+            try:
+                rendered = measure_render(script)
+                render = f"{rendered['seconds']:.2f}"
+                if rendered["errors"]:
+                    failures.append(f"{name}: render raised {rendered['errors'][0]}")
+            except RuntimeError as e:
+                render = "error"
+                failures.append(f"{name}: render failed ({e})")
+
+        rss = f"{result['rss_mb']:.0f}" if result["rss_mb"] is not None else "-"
+        print(f"{name:<28} {result['seconds']:>9.2f} {rss:>8} {render:>9}  {', '.join(result['heavy']) or '-'}")
+
+        if result["seconds"] > args.budget:
+            failures.append(f"{name}: imports took {result['seconds']:.2f}s (budget {args.budget:.2f}s)")
+        if result["heavy"]:
+            failures.append(f"{name}: imports {', '.join(result['heavy'])} at startup")
+
+    if failures:
+        print("\nFAILED:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("\nAll scripts within budget.")
+
+
+if __name__ == "__main__":
+    main()